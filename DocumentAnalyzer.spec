@@ -1,16 +1,32 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
+# 分类只需 model/compact 中的精简推理模型（纯 numpy），不再打包 sklearn 流水线模型与 sklearn/scipy。
+# 设置环境变量 DOCUMENT_ANALYZER_ONLINE=1 时保留 sklearn，打包后的程序才能根据人工修正增量更新模型
+online_learning = os.environ.get("DOCUMENT_ANALYZER_ONLINE") == "1"
+
+# model/jieba.cache 不入库，打包前先生成，随程序打包以缩短首次启动时间
+import jieba
+jieba.dt.cache_file = os.path.join(SPECPATH, "model", "jieba.cache")
+jieba.initialize()
+
+datas = [('model/compact', 'model/compact'), ('model/jieba.cache', 'model'), ('stopwords.txt', '.'),
+         ('health_corpus.txt', '.')]
+# 领域实体词典与领域 IDF 索引是可选资源，存在时一并打包，打包后的程序与源码运行时的结果一致
+for optional in ('model/gazetteer', 'model/corpus_index'):
+    if os.path.isdir(os.path.join(SPECPATH, optional)):
+        datas.append((optional, optional))
 
 a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('model', 'model'), ('stopwords.txt', '.'), ('health_corpus.txt', '.')],
-    hiddenimports=['sklearn.pipeline', 'sklearn.feature_extraction.text', 'sklearn.linear_model', 'sklearn.linear_model._logistic', 'sklearn.utils._cython_blas', 'sklearn.utils._typedefs', 'sklearn.metrics._classification'],
+    datas=datas,
+    hiddenimports=[],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=[] if online_learning else ['sklearn', 'scipy'],
     noarchive=False,
     optimize=0,
 )
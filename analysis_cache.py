@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import nlp_core
+
+# 分析逻辑变化导致结果不同时递增，使旧缓存失效
+CACHE_VERSION = 3
+DEFAULT_MAXSIZE = 256
+CACHED_FIELDS = ("Title", "ClassLabel", "KeyWord_HFWord", "NamedEntity", "Abstract")
+
+
+def content_key(title, document):
+    h = hashlib.sha1()
+    for part in (str(CACHE_VERSION), nlp_core.model_version(), nlp_core.stopwords_version(),
+                 nlp_core.keyword_idf_version(), nlp_core.gazetteer_version(), title, document):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    # 两级缓存：内存 LRU + 可选的 SQLite 磁盘缓存；结果中不保存原文，取出时再补回
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, disk_path=None):
+        self.maxsize = maxsize
+        self.lock = threading.RLock()
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.conn = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self.conn = sqlite3.connect(disk_path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS analysis (key TEXT PRIMARY KEY, result TEXT)")
+            self.conn.commit()
+
+    def _remember(self, key, fields):
+        self.memory[key] = fields
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def get(self, title, document, key=None):
+        key = key or content_key(title, document)
+        with self.lock:
+            fields = self.memory.get(key)
+            if fields is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+            elif self.conn is not None:
+                row = self.conn.execute("SELECT result FROM analysis WHERE key = ?", (key,)).fetchone()
+                if row:
+                    fields = json.loads(row[0])
+                    self._remember(key, fields)
+                    self.disk_hits += 1
+            if fields is None:
+                self.misses += 1
+                return None
+        return dict(fields, Document=document)
+
+    def _store(self, key, result):
+        fields = {k: str(result[k]) for k in CACHED_FIELDS}
+        self._remember(key, fields)
+        if self.conn is not None:
+            self.conn.execute("INSERT OR REPLACE INTO analysis VALUES (?, ?)",
+                              (key, json.dumps(fields, ensure_ascii=False)))
+
+    def put(self, title, document, result, key=None):
+        key = key or content_key(title, document)
+        with self.lock:
+            self._store(key, result)
+            if self.conn is not None:
+                self.conn.commit()
+
+    def analyze(self, title, document):
+        return self.analyze_batch([(title, document)])[0]
+
+    def analyze_batch(self, items):
+        keys = [content_key(title, document) for title, document in items]
+        results = [self.get(title, document, key) for (title, document), key in zip(items, keys)]
+        missing = [i for i, res in enumerate(results) if res is None]
+        if missing:
+            computed = nlp_core.analyze_batch([items[i] for i in missing])
+            with self.lock:
+                for i, res in zip(missing, computed):
+                    self._store(keys[i], res)
+                    results[i] = res
+                if self.conn is not None:
+                    self.conn.commit()
+        return results
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+                "size": len(self.memory),
+            }
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
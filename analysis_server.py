@@ -0,0 +1,279 @@
+import sys
+import json
+import time
+import queue
+import traceback
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jieba
+import nlp_core
+from analysis_cache import AnalysisCache
+from batch_engine import Failure
+from jsonl_reader import parse_record
+from stage_profiler import distribution
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH = 32
+DEFAULT_WINDOW_MS = 10
+DEFAULT_QUEUE_SIZE = 256
+REQUEST_TIMEOUT = 60
+MAX_BODY_BYTES = 64 << 20
+# /metrics 中延迟分布统计最近的若干个请求
+LATENCY_WINDOW = 10000
+
+
+class ServiceMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.documents = 0
+        self.errors = 0
+        self.rejected = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+
+    def record_request(self, n_docs, elapsed):
+        with self.lock:
+            self.requests += 1
+            self.documents += n_docs
+            self.latencies.append(elapsed)
+
+    def record_batch(self, n_docs):
+        with self.lock:
+            self.batches += 1
+            self.batch_sizes.append(n_docs)
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def record_rejected(self):
+        with self.lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self.lock:
+            uptime = time.time() - self.started
+            return {
+                "uptime": uptime,
+                "requests": self.requests,
+                "documents": self.documents,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "docs_per_sec": self.documents / uptime if uptime else 0.0,
+                "latency_ms": distribution(list(self.latencies), scale=1000),
+                "batch_size": distribution(list(self.batch_sizes)),
+            }
+
+
+class DocumentError(Exception):
+    # 请求中某篇文档分析出错；index 为该文档在请求中的序号
+
+    def __init__(self, index, error, detail):
+        super().__init__(f"第 {index + 1} 篇文档分析出错：{error}")
+        self.index = index
+        self.detail = detail
+
+
+class MicroBatcher:
+    # 并发请求先进入队列，由单个线程合并成批：攒够 max_batch 篇文档或等待超过 window 秒即提交，
+    # 整批只做一次分类预测；等待处理的文档数超过 queue_size 时 submit 立即抛出 queue.Full，由调用方返回 503
+    # （队列为空时单个超过 queue_size 篇的请求仍会接受，否则它永远无法被处理）
+
+    def __init__(self, cache, metrics, max_batch=DEFAULT_MAX_BATCH, window=DEFAULT_WINDOW_MS / 1000,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.cache = cache
+        self.metrics = metrics
+        self.max_batch = max_batch
+        self.window = window
+        self.queue_size = queue_size
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, items):
+        future = Future()
+        with self.lock:
+            if self.pending and self.pending + len(items) > self.queue_size:
+                raise queue.Full
+            self.pending += len(items)
+        self.queue.put_nowait((items, future))
+        return future
+
+    def take(self, **kwargs):
+        job = self.queue.get(**kwargs)
+        with self.lock:
+            self.pending -= len(job[0])
+        return job
+
+    def analyze(self, items):
+        # 与 batch_engine.analyze_items 相同：整批出错时逐篇重新分析，出错的文档以 Failure 代替结果
+        try:
+            return self.cache.analyze_batch(items)
+        except Exception:
+            results = []
+            for item in items:
+                try:
+                    results.append(self.cache.analyze(*item))
+                except Exception as e:
+                    results.append(Failure(f"{type(e).__name__}: {e}", traceback.format_exc()))
+            return results
+
+    def collect(self):
+        jobs = [self.take()]
+        n_docs = len(jobs[0][0])
+        deadline = time.monotonic() + self.window
+        while n_docs < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self.take(timeout=remaining)
+            except queue.Empty:
+                break
+            jobs.append(job)
+            n_docs += len(job[0])
+        return jobs
+
+    def run(self):
+        while True:
+            jobs = self.collect()
+            items = [item for job_items, _ in jobs for item in job_items]
+            results = self.analyze(items)
+            self.metrics.record_batch(len(items))
+            pos = 0
+            for job_items, future in jobs:
+                job_results = results[pos:pos + len(job_items)]
+                pos += len(job_items)
+                # 只有包含出错文档的请求返回错误，同批的其他请求不受影响
+                failed = [(i, res) for i, res in enumerate(job_results) if isinstance(res, Failure)]
+                if failed:
+                    index, failure = failed[0]
+                    future.set_exception(DocumentError(index, failure.error, failure.detail))
+                else:
+                    future.set_result(job_results)
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    server_version = "DocumentAnalyzer/1.0"
+    batcher = None
+    metrics = None
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError("请求体过大")
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            data = self.metrics.snapshot()
+            data["queue_depth"] = self.batcher.pending
+            data["cache"] = self.batcher.cache.stats()
+            data["load_metrics"] = nlp_core.get_load_metrics()
+            data["model_version"] = nlp_core.model_version()
+            self.send_json(200, data)
+        elif self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": "未知路径"})
+
+    def do_POST(self):
+        if self.path not in ("/analyze", "/batch"):
+            self.send_json(404, {"error": "未知路径"})
+            return
+        start = time.perf_counter()
+        try:
+            data = self.read_json()
+            if self.path == "/analyze":
+                items = [parse_record(data)]
+            else:
+                items = [parse_record(d) for d in data["documents"]]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.metrics.record_error()
+            self.send_json(400, {"error": f"请求格式错误：{e}"})
+            return
+        if not items:
+            self.send_json(200, {"results": []})
+            return
+
+        try:
+            future = self.batcher.submit(items)
+        except queue.Full:
+            self.metrics.record_rejected()
+            self.send_json(503, {"error": "服务繁忙，请稍后重试"}, {"Retry-After": "1"})
+            return
+        try:
+            results = future.result(REQUEST_TIMEOUT)
+        except DocumentError as e:
+            self.metrics.record_error()
+            self.send_json(500, {"error": str(e), "index": e.index})
+            return
+        except Exception as e:
+            self.metrics.record_error()
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        self.metrics.record_request(len(items), time.perf_counter() - start)
+        if self.path == "/analyze":
+            self.send_json(200, results[0])
+        else:
+            self.send_json(200, {"results": results})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(host=DEFAULT_HOST, port=DEFAULT_PORT, max_batch=DEFAULT_MAX_BATCH, window_ms=DEFAULT_WINDOW_MS,
+                  queue_size=DEFAULT_QUEUE_SIZE, cache_path=None):
+    nlp_core.preload()
+    metrics = ServiceMetrics()
+    batcher = MicroBatcher(AnalysisCache(disk_path=cache_path), metrics, max_batch, window_ms / 1000, queue_size)
+    handler = type("BoundAnalysisHandler", (AnalysisHandler,), {"batcher": batcher, "metrics": metrics})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地 HTTP 文档分析服务")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="监听地址，默认只监听本机")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="合并成一批的最大文档数")
+    parser.add_argument("--window-ms", type=float, default=DEFAULT_WINDOW_MS, help="攒批的最长等待时间（毫秒）")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="等待处理的文档数上限，超出时返回 503")
+    parser.add_argument("--cache", default=None, help="分析结果磁盘缓存（SQLite）路径")
+    args = parser.parse_args(argv)
+
+    jieba.setLogLevel(jieba.logging.WARNING)
+    server = create_server(args.host, args.port, args.max_batch, args.window_ms, args.queue_size, args.cache)
+    print(f"分析服务已启动：http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
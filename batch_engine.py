@@ -0,0 +1,488 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+from collections import deque, namedtuple
+
+import jieba
+import nlp_core
+from analysis_cache import AnalysisCache
+from dedup import DEFAULT_THRESHOLD, Deduplicator
+from jsonl_reader import INPUT_SUFFIXES, iter_documents, iter_records
+from result_writer import open_result_sink
+from stage_profiler import StageRecorder
+
+RESULT_DIR = "result"
+RESULT_FILE = "result_log.jsonl"
+DEFAULT_CHUNKSIZE = 32
+# 两次检查点之间的最长间隔（秒）
+CHECKPOINT_INTERVAL = 5.0
+
+# 分析出错的文档在结果列表中以 Failure 表示，error 为异常摘要，detail 为完整的调用栈
+Failure = namedtuple("Failure", ["error", "detail"])
+
+worker_cache = None
+worker_recorder = None
+
+
+def natural_key(name):
+    return [int(c) if c.isdigit() else c.lower() for c in re.split('([0-9]+)', name)]
+
+
+def list_jsonl_files(directory):
+    files = [f for f in os.listdir(directory) if f.endswith(INPUT_SUFFIXES)]
+    files.sort(key=natural_key)
+    return files
+
+
+def result_log_path(directory):
+    return os.path.join(directory, RESULT_DIR, RESULT_FILE)
+
+
+def checkpoint_path(save_path):
+    return os.path.splitext(save_path)[0] + ".checkpoint.json"
+
+
+def failed_path(save_path):
+    return os.path.splitext(save_path)[0] + ".failed.jsonl"
+
+
+def watch_state_path(save_path):
+    return os.path.splitext(save_path)[0] + ".watch.json"
+
+
+def record_name(record):
+    # 单条记录的文件沿用文件名；同一文件中的后续记录以 "文件名#行号" 区分
+    if record.line_no == 1:
+        return record.source
+    return f"{record.source}#{record.line_no}"
+
+
+def result_record(D_Mark, FileName, Title, KeyWord_HFWord, ClassLabel, NamedEntity, Abstract, Document,
+                  DuplicateOf=None):
+    one_result = {}
+    timestamp = time.time()
+    one_result["TimeStamp"] = [str(timestamp)]
+    one_result["D_Mark"] = [D_Mark]
+    one_result["FileName"] = [FileName]
+    one_result["Title"] = [Title]
+    one_result["KeyWord_HFWord"] = [KeyWord_HFWord]
+    one_result["ClassLabel"] = [ClassLabel]
+    one_result["NamedEntity"] = [NamedEntity]
+    one_result["Abstract"] = [Abstract]
+    one_result["Document"] = [Document]
+    if DuplicateOf:
+        # 去重后复用了该代表文档的分析结果
+        one_result["DuplicateOf"] = [DuplicateOf]
+    return one_result
+
+
+def result_line(*args, **kwargs):
+    return json.dumps(result_record(*args, **kwargs), ensure_ascii=False) + "\n"
+
+
+def init_worker(cache_path=None, profile_every=None, memory_budget=None):
+    # 每个工作进程只加载一次词典与分类模型
+    global worker_cache, worker_recorder
+    jieba.setLogLevel(jieba.logging.WARNING)
+    if memory_budget:
+        nlp_core.set_memory_budget(memory_budget)
+    nlp_core.preload()
+    worker_cache = AnalysisCache(disk_path=cache_path)
+    worker_recorder = None
+    if profile_every is not None:
+        worker_recorder = StageRecorder(profile_every)
+        nlp_core.set_instrumentation(worker_recorder)
+
+
+def analyze_items(items):
+    # 一个任务处理一组文档，分类器对整组只调用一次 predict
+    # 返回结果以及本组的阶段统计（未开启统计时为 None）
+    try:
+        results = worker_cache.analyze_batch(items)
+    except Exception:
+        results = []
+        for item in items:
+            try:
+                results.append(worker_cache.analyze(*item))
+            except Exception as e:
+                results.append(Failure(f"{type(e).__name__}: {e}", traceback.format_exc()))
+    return results, worker_recorder.drain() if worker_recorder else None
+
+
+def iter_chunks(records, chunksize):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def needs_analysis(record):
+    return record.document and not record.error and not record.duplicate_of
+
+
+def chunk_items(chunk):
+    # 读取失败、正文为空或已判定为重复的记录不送入工作进程
+    return [(r.title, r.document) for r in chunk if needs_analysis(r)]
+
+
+def merge_chunk(chunk, output, recorder=None):
+    results, stats = output
+    if recorder is not None and stats:
+        recorder.merge(stats)
+    results = iter(results)
+    for record in chunk:
+        if needs_analysis(record):
+            yield record, next(results)
+        else:
+            yield record, None
+
+
+def iter_local_results(records, chunksize=DEFAULT_CHUNKSIZE, recorder=None):
+    # 在当前进程内顺序分析，调用前需已执行 init_worker
+    for chunk in iter_chunks(records, chunksize):
+        yield from merge_chunk(chunk, analyze_items(chunk_items(chunk)), recorder)
+
+
+def iter_pool_results(pool, records, max_pending, chunksize=DEFAULT_CHUNKSIZE, recorder=None):
+    # 最多同时有 max_pending 组文档在处理中，输入流再大内存占用也有上限
+    pending = deque()
+    for chunk in iter_chunks(records, chunksize):
+        pending.append((chunk, pool.apply_async(analyze_items, (chunk_items(chunk),))))
+        if len(pending) >= max_pending:
+            chunk, async_result = pending.popleft()
+            yield from merge_chunk(chunk, async_result.get(), recorder)
+    while pending:
+        chunk, async_result = pending.popleft()
+        yield from merge_chunk(chunk, async_result.get(), recorder)
+
+
+def open_pool(workers, cache_path=None, profile_every=None, memory_budget=None):
+    return multiprocessing.Pool(workers, initializer=init_worker, initargs=(cache_path, profile_every, memory_budget))
+
+
+def iter_results(records, workers=None, chunksize=DEFAULT_CHUNKSIZE, cache_path=None, max_pending=None,
+                 recorder=None, memory_budget=None):
+    # 传入 recorder 时各工作进程记录阶段统计，并在每组完成后汇总到 recorder
+    profile_every = recorder.profile_every if recorder is not None else None
+    if workers == 1:
+        init_worker(cache_path, profile_every, memory_budget)
+        try:
+            yield from iter_local_results(records, chunksize, recorder)
+        finally:
+            nlp_core.set_instrumentation(None)
+        return
+    workers = workers or os.cpu_count() or 1
+    with open_pool(workers, cache_path, profile_every, memory_budget) as pool:
+        yield from iter_pool_results(pool, records, max_pending or workers * 2, chunksize, recorder)
+
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def truncate_file(path, size):
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        os.truncate(path, size)
+
+
+class BatchJob:
+    # 批量任务的检查点与失败记录
+    #   检查点记录最后一条已写出结果的输入位置、结果文件与失败文件的长度以及计数，结果 fsync 之后每隔
+    #   interval 秒原子更新一次；续跑时先把两个文件截回检查点时的长度，再从该位置继续读取，不会重复写出
+    #   读取/解析失败或分析出错的输入连同错误信息写入失败文件（每行一条），可用 retry_failed 单独重试
+    #   续跑时沿用检查点记录的文件列表，之后新增到目录中的文件留给下一次批量分析或监视
+
+    def __init__(self, directory, save_path, file_list, interval=CHECKPOINT_INTERVAL):
+        self.directory = directory
+        self.save_path = save_path
+        self.state_path = checkpoint_path(save_path)
+        self.failed_path = failed_path(save_path)
+        self.file_list = list(file_list)
+        self.interval = interval
+        self.state = {"files": self.file_list, "source": None, "offset": 0, "line": 0, "total": 0, "success": 0,
+                      "failed": 0, "result_size": 0, "failed_size": 0, "finished": False}
+        self.failed_file = None
+        self.last_checkpoint = time.monotonic()
+
+    def load(self):
+        # 可续跑的检查点：尚未完成，且记录的输入位置仍然有效；不比较当前的文件列表，
+        # 中断后目录中新增了文件也能识别出未完成的任务
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("finished") or not self.resumable(state):
+            return None
+        return state
+
+    def resumable(self, state):
+        # 还没有写出任何结果，或记录的文件仍在且不短于记录的偏移（gzip 文件的偏移是解压后的，只检查文件是否存在）
+        source = state.get("source")
+        if source is None:
+            return True
+        if source not in state.get("files", []):
+            return False
+        path = os.path.join(self.directory, source)
+        if not os.path.exists(path):
+            return False
+        return source.endswith(".gz") or os.path.getsize(path) >= state.get("offset", 0)
+
+    def start(self, resume=False):
+        # 返回是否从检查点续跑
+        state = self.load() if resume else None
+        if state:
+            self.state = state
+            truncate_file(self.save_path, state["result_size"])
+            truncate_file(self.failed_path, state["failed_size"])
+        else:
+            for key, path in (("result_size", self.save_path), ("failed_size", self.failed_path)):
+                self.state[key] = os.path.getsize(path) if os.path.exists(path) else 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.failed_path)), exist_ok=True)
+        self.failed_file = open(self.failed_path, "a", encoding="utf-8")
+        write_json_atomic(self.state_path, dict(self.state, updated=time.time()))
+        self.last_checkpoint = time.monotonic()
+        return state is not None
+
+    def fail(self, record, error, detail=None):
+        entry = {"source": record.source, "line_no": record.line_no, "title": record.title, "error": error,
+                 "detail": detail, "time": time.time()}
+        self.failed_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.state["failed"] += 1
+
+    def advance(self, record, sink, success):
+        # record 及其之前的输入都已处理完毕
+        self.state["total"] += 1
+        self.state["success"] += bool(success)
+        self.state.update(source=record.source, offset=record.next_offset, line=record.line_no)
+        if time.monotonic() - self.last_checkpoint >= self.interval:
+            self.checkpoint(sink)
+
+    def checkpoint(self, sink, finished=False):
+        sink.checkpoint()
+        self.failed_file.flush()
+        os.fsync(self.failed_file.fileno())
+        self.state.update(result_size=os.path.getsize(self.save_path) if os.path.exists(self.save_path) else 0,
+                          failed_size=os.path.getsize(self.failed_path), finished=finished)
+        write_json_atomic(self.state_path, dict(self.state, updated=time.time()))
+        self.last_checkpoint = time.monotonic()
+
+    def close(self):
+        if self.failed_file is not None:
+            self.failed_file.close()
+            self.failed_file = None
+
+
+def clear_job(save_path):
+    # 清空结果时一并删除检查点、失败文件与监视状态
+    for path in (checkpoint_path(save_path), failed_path(save_path), watch_state_path(save_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def unfinished_job(directory, save_path):
+    return BatchJob(directory, save_path, []).load()
+
+
+def write_results(job, sink, records_results, progress=None, dedup=None):
+    for record, res in records_results:
+        name = record_name(record)
+        duplicate_of = record.duplicate_of
+        if record.error:
+            job.fail(record, record.error)
+            res = None
+        elif isinstance(res, Failure):
+            job.fail(record, res.error, res.detail)
+            res = None
+        elif dedup is not None:
+            try:
+                res, duplicate_of = dedup.resolve(record, name, res)
+            except Exception as e:
+                job.fail(record, f"{type(e).__name__}: {e}", traceback.format_exc())
+                res = None
+        if res:
+            sink.write_record(result_record("A", name, res["Title"], res["KeyWord_HFWord"], res["ClassLabel"],
+                                            res["NamedEntity"], res["Abstract"], res["Document"],
+                                            duplicate_of))
+        job.advance(record, sink, res)
+        if progress:
+            progress(job.state["total"], record)
+
+
+def run_batch(directory, file_list=None, workers=None, chunksize=DEFAULT_CHUNKSIZE, save_path=None,
+              progress=None, cache_path=None, start_source=None, start_offset=0, start_line=0, recorder=None,
+              dedup=None, memory_budget=None, resume=False, job=None):
+    # resume 为真且存在未完成的检查点时从检查点继续（忽略 start_*）；返回累计的 (成功数, 总数)
+    if file_list is None:
+        file_list = list_jsonl_files(directory)
+    save_path = save_path or result_log_path(directory)
+    job = job or BatchJob(directory, save_path, file_list)
+    if job.start(resume):
+        file_list = job.file_list = job.state["files"]
+        start_source, start_offset, start_line = job.state["source"], job.state["offset"], job.state["line"]
+    records = iter_documents([os.path.join(directory, f) for f in file_list], start_source, start_offset,
+                             start_line)
+    if dedup is not None:
+        records = dedup.annotate(records, record_name)
+
+    try:
+        with open_result_sink(save_path) as sink:
+            try:
+                write_results(job, sink, iter_results(records, workers, chunksize, cache_path, recorder=recorder,
+                                                      memory_budget=memory_budget), progress, dedup)
+            except BaseException:
+                # 中断时保存到最后一条已处理的记录为止，下次可从这里续跑
+                job.checkpoint(sink)
+                raise
+            job.checkpoint(sink, finished=True)
+    finally:
+        job.close()
+    return job.state["success"], job.state["total"]
+
+
+def read_failed(path):
+    entries = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    return entries
+
+
+def retry_failed(directory, save_path=None, workers=1, chunksize=DEFAULT_CHUNKSIZE, cache_path=None):
+    # 重新读取并分析失败文件中的输入：成功的结果追加到结果文件，仍然失败的留在失败文件中
+    # 返回 (成功数, 仍失败数)
+    save_path = save_path or result_log_path(directory)
+    if unfinished_job(directory, save_path):
+        raise RuntimeError("上次的批量任务尚未完成，请先续跑（--resume）")
+    entries = read_failed(failed_path(save_path))
+    if not entries:
+        return 0, 0
+    wanted = {}
+    for entry in entries:
+        wanted.setdefault(entry["source"], set()).add(entry["line_no"])
+    remaining = [e for e in entries if not os.path.exists(os.path.join(directory, e["source"]))]
+
+    def records():
+        for source in sorted(wanted, key=natural_key):
+            path = os.path.join(directory, source)
+            if os.path.exists(path):
+                for record in iter_records(path):
+                    if record.line_no in wanted[source]:
+                        yield record
+
+    job = BatchJob(directory, save_path, [])
+    job.failed_path = job.failed_path + ".retry"
+    job.state_path = job.state_path + ".retry"
+    truncate_file(job.failed_path, 0)
+    try:
+        job.start()
+        with open_result_sink(save_path) as sink:
+            write_results(job, sink, iter_results(records(), workers, chunksize, cache_path))
+            job.checkpoint(sink, finished=True)
+    finally:
+        job.close()
+    # 仍然失败的记录替换原失败文件（文件已不存在的记录原样保留）
+    with open(job.failed_path, "a", encoding="utf-8") as f:
+        for entry in remaining:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(job.failed_path, failed_path(save_path))
+    os.remove(job.state_path)
+    return job.state["success"], job.state["failed"] + len(remaining)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量分析目录下 JSONL 文件中的全部记录（无界面）")
+    parser.add_argument("directory", help="包含 .jsonl / .jsonl.gz 文件的目录")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="工作进程数，默认为 CPU 核数")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="每次分发给工作进程的文档数，同时也是分类器的批大小")
+    parser.add_argument("-o", "--output", default=None,
+                        help="结果文件路径，默认为 <目录>/result/result_log.jsonl；以 .rlog 结尾时写入紧凑的二进制结果日志")
+    parser.add_argument("--cache", default=None, help="分析结果磁盘缓存（SQLite）路径，重复分析未变化的文档时直接复用")
+    parser.add_argument("--start-file", default=None, help="从该文件继续处理（配合 --start-offset 断点续跑）")
+    parser.add_argument("--start-offset", type=int, default=0, help="起始文件中的字节偏移")
+    parser.add_argument("--start-line", type=int, default=0, help="起始偏移之前已读取的行数，用于保持记录编号")
+    parser.add_argument("--stats", default=None, help="将各阶段耗时的汇总（含直方图）写入该 JSON 文件")
+    parser.add_argument("--profile", default=None, help="将抽样文档的 cProfile 结果写入该 pstats 文件")
+    parser.add_argument("--profile-every", type=int, default=100, help="每隔多少篇文档抽样一次 cProfile")
+    parser.add_argument("--dedup", action="store_true", help="分析前检测完全重复与近似重复的文档，重复文档复用已有结果")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="判定近似重复的 Jaccard 相似度下限")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="单篇文档分词中间结果的内存上限（MB），超长文档按相应大小的窗口流式分析")
+    parser.add_argument("--resume", action="store_true", help="存在未完成的检查点时从检查点继续，不重复分析已写出的记录")
+    parser.add_argument("--retry-failed", action="store_true", help="只重新分析失败文件中记录的输入")
+    parser.add_argument("--checkpoint-interval", type=float, default=CHECKPOINT_INTERVAL,
+                        help="两次检查点之间的最长间隔（秒）")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"目录不存在：{args.directory}")
+        return 1
+
+    recorder = None
+    if args.stats or args.profile:
+        recorder = StageRecorder(args.profile_every if args.profile else 0)
+
+    dedup = Deduplicator(args.dedup_threshold) if args.dedup else None
+    memory_budget = int(args.memory_budget * (1 << 20)) if args.memory_budget else None
+
+    save_path = args.output or result_log_path(args.directory)
+    start = time.time()
+    if args.retry_failed:
+        try:
+            success_count, failed_count = retry_failed(args.directory, save_path, args.workers or 1,
+                                                       args.chunksize, args.cache)
+        except RuntimeError as e:
+            print(e)
+            return 1
+        print(f"重试结束！成功分析：{success_count} 篇，仍然失败：{failed_count} 篇，耗时 {time.time() - start:.1f} 秒")
+        return 0
+
+    job = BatchJob(args.directory, save_path, list_jsonl_files(args.directory), args.checkpoint_interval)
+    state = job.load() if args.resume else None
+    if state:
+        print(f"从检查点继续：已处理 {state['total']} 篇文档")
+    success_count, total = run_batch(args.directory, workers=args.workers, chunksize=args.chunksize,
+                                     save_path=save_path, cache_path=args.cache,
+                                     start_source=args.start_file, start_offset=args.start_offset,
+                                     start_line=args.start_line, recorder=recorder, dedup=dedup,
+                                     memory_budget=memory_budget, resume=args.resume, job=job)
+    elapsed = time.time() - start
+    print(f"处理结束！成功分析：{success_count}/{total}篇文档，耗时 {elapsed:.1f} 秒")
+    if job.state["failed"]:
+        print(f"失败 {job.state['failed']} 篇，详情见：{job.failed_path}（可用 --retry-failed 重试）")
+    if args.workers == 1:
+        print(f"缓存统计：{worker_cache.stats()}")
+    if dedup is not None:
+        print(f"去重统计：{dedup.stats()}")
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump(recorder.summary(), f, ensure_ascii=False, indent=1)
+        print(f"阶段统计已保存：{args.stats}")
+    if args.profile and recorder.dump_profile(args.profile):
+        print(f"cProfile 抽样结果已保存：{args.profile}")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+import jieba
+import nlp_core
+from batch_engine import run_batch
+
+CORPUS_PATH = nlp_core.get_resource_path("health_corpus.txt")
+DEFAULT_SIZES = (200, 2000, 20000)
+DEFAULT_DOCS = 20
+DEFAULT_REPEAT = 3
+REGRESSION_THRESHOLD = 1.2
+
+
+def load_corpus_lines():
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def corpus_document(lines, size, rng):
+    # 语料派生：从随机位置起连续拼接语料行，直到达到目标长度
+    start = rng.randrange(len(lines))
+    parts = []
+    length = 0
+    i = start
+    while length < size:
+        parts.append(lines[i % len(lines)])
+        length += len(parts[-1]) + 1
+        i += 1
+    return "。".join(parts)[:size]
+
+
+def synthetic_document(words, size, rng):
+    # 合成：按语料词表随机组句，句长与标点随机
+    parts = []
+    length = 0
+    while length < size:
+        sentence = "".join(rng.choice(words) for _ in range(rng.randint(4, 16)))
+        sentence += rng.choice("。。。！？，")
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)[:size]
+
+
+def make_inputs(kind, size, n_docs, seed=42):
+    rng = random.Random(f"{kind}-{size}-{seed}")
+    lines = load_corpus_lines()
+    if kind == "corpus":
+        make = lambda: corpus_document(lines, size, rng)
+    else:
+        words = sorted({w for line in lines for w in jieba.lcut(line) if len(w) > 1})
+        make = lambda: synthetic_document(words, size, rng)
+    return [(rng.choice(lines)[:rng.randint(6, 20)], make()) for _ in range(n_docs)]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def clear_caches():
+    # 未登录词切分的 lru_cache 在预热后已包含全部输入的片段，每轮计时前清空，测得的是未命中缓存时的开销
+    nlp_core._cut_unknown.cache_clear()
+
+
+def measure(func, items, repeat=1):
+    # 先不计时地跑一遍，排除首次调用的加载开销
+    for item in items:
+        func(item)
+    latencies = []
+    for _ in range(repeat):
+        clear_caches()
+        for item in items:
+            start = time.perf_counter()
+            func(item)
+            latencies.append(time.perf_counter() - start)
+
+    clear_caches()
+    tracemalloc.start()
+    for item in items:
+        func(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(latencies)
+    return {
+        "docs": len(latencies),
+        "docs_per_sec": len(latencies) / total if total else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_mem_mb": peak / 1024 / 1024,
+    }
+
+
+def stage_benchmarks(items):
+    # 各阶段的 (计时函数, 输入列表)
+    stopwords = nlp_core.load_stopwords()
+    clf = nlp_core.load_classifier()
+    stages = {
+        "extract_keywords": (lambda item: nlp_core.extract_keywords(item[0] + " " + item[1], stopwords), items),
+        "extract_entities": (lambda item: nlp_core.extract_entities(item[1], stopwords), items),
+        "get_best_abstract": (lambda item: nlp_core.get_best_abstract(item[0], item[1], 200), items),
+        "analyze_content": (lambda item: nlp_core.analyze_content(item[0], item[1]), items),
+    }
+    if clf is not None:
+        inputs = [nlp_core.AnalyzedDocument(title, document, stopwords).classifier_input()
+                  for title, document in items]
+        stages["classifier_predict"] = (lambda text: clf.predict([text]), inputs)
+    return stages
+
+
+def batch_benchmark(items, workers):
+    tmp_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        for i, (title, document) in enumerate(items, 1):
+            with open(os.path.join(tmp_dir, f"{i}.jsonl"), "w", encoding="utf-8") as f:
+                f.write(json.dumps({"title": title, "content": document}, ensure_ascii=False) + "\n")
+        start = time.perf_counter()
+        success_count, total = run_batch(tmp_dir, workers=workers)
+        elapsed = time.perf_counter() - start
+        return {"docs": total, "succeeded": success_count, "workers": workers,
+                "docs_per_sec": total / elapsed if elapsed else 0.0, "seconds": elapsed}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes=DEFAULT_SIZES, n_docs=DEFAULT_DOCS, repeat=DEFAULT_REPEAT, kinds=("corpus", "synthetic"),
+              batch_docs=200, workers=1):
+    nlp_core.preload()
+    results = {}
+    for kind in kinds:
+        for size in sizes:
+            items = make_inputs(kind, size, n_docs)
+            for stage, (func, inputs) in stage_benchmarks(items).items():
+                name = f"{kind}/{size}/{stage}"
+                results[name] = measure(func, inputs, repeat)
+                print_row(name, results[name])
+    if batch_docs:
+        items = make_inputs("corpus", sizes[0], batch_docs)
+        results["batch/directory"] = batch_benchmark(items, workers)
+        print_row("batch/directory", results["batch/directory"])
+    return {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "load_metrics": nlp_core.get_load_metrics(),
+        "results": results,
+    }
+
+
+def print_row(name, stats):
+    line = f"{name:<42} {stats['docs_per_sec']:>10.1f} docs/s"
+    if "p50_ms" in stats:
+        line += f"  p50 {stats['p50_ms']:>9.2f} ms  p99 {stats['p99_ms']:>9.2f} ms"
+        line += f"  peak {stats['peak_mem_mb']:>7.2f} MB"
+    print(line)
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    # 吞吐量低于基线的 1/threshold 视为性能退化
+    regressions = []
+    print(f"\n对比基线 {baseline.get('revision')} -> {report.get('revision')}")
+    for name, stats in report["results"].items():
+        old = baseline["results"].get(name)
+        if not old or not old["docs_per_sec"]:
+            continue
+        ratio = stats["docs_per_sec"] / old["docs_per_sec"]
+        flag = ""
+        if ratio * threshold < 1:
+            flag = "  <-- 退化"
+            regressions.append(name)
+        print(f"{name:<42} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分析热点路径的性能基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="文档长度（字符数）")
+    parser.add_argument("--docs", type=int, default=DEFAULT_DOCS, help="每种长度的文档数")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每篇文档重复计时的次数")
+    parser.add_argument("--kinds", nargs="+", default=["corpus", "synthetic"], choices=["corpus", "synthetic"])
+    parser.add_argument("--batch-docs", type=int, default=200, help="目录批量吞吐测试的文件数，0 表示跳过")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="目录批量测试的工作进程数")
+    parser.add_argument("--save", default=None, help="将结果保存为 JSON 基线")
+    parser.add_argument("--compare", default=None, help="与已保存的 JSON 基线对比")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="判定退化的吞吐量比例")
+    args = parser.parse_args(argv)
+
+    jieba.setLogLevel(jieba.logging.WARNING)
+    report = run_suite(args.sizes, args.docs, args.repeat, args.kinds, args.batch_docs, args.workers)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print(f"\n基线已保存：{args.save}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+
+import jieba
+import numpy as np
+
+import nlp_core
+from batch_engine import list_jsonl_files, record_name, result_log_path
+from jsonl_reader import iter_documents
+
+# 索引目录中的文件：
+#   terms.npy          排序后的词表
+#   idf.npy            与词表对应的 IDF
+#   postings_ptr.npy   词 i 的文档编号位于 postings[ptr[i]:ptr[i + 1]]
+#   postings.npy       倒排表（文档编号）
+#   documents.json     文档编号 -> 文档名（文件名或 "文件名#行号"）
+#   meta.json          文档数、默认 IDF、版本等
+DEFAULT_INDEX_DIR = nlp_core.KEYWORD_INDEX_DIR
+
+
+def init_index_worker():
+    jieba.setLogLevel(jieba.logging.WARNING)
+    nlp_core.init_jieba()
+    nlp_core.load_stopwords()
+
+
+def document_terms(item):
+    # 倒排索引收录除停用词与标点外的全部词（"健康" 这样的形容词也能查到）；
+    # 可作为关键词的词即使在停用词表中也保留，保证关键词的领域 IDF 完整
+    title, document = item
+    stopwords = nlp_core.load_stopwords()
+    pairs = nlp_core.segment(title)[1] + nlp_core.segment(document)[1]
+    terms = {w for w, flag in pairs if flag != 'x' and w.strip() and w not in stopwords}
+    terms.update(nlp_core.keyword_terms(pairs))
+    return sorted(terms)
+
+
+def iter_health_corpus():
+    with open(nlp_core.get_resource_path("health_corpus.txt"), "r", encoding="utf-8") as f:
+        for i, line in enumerate(f, 1):
+            if line.strip():
+                yield f"health_corpus.txt#{i}", "", line.strip()
+
+
+def iter_result_documents(path):
+    # 以往结果日志中每个文件最新一条记录的原文
+    latest = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+                name = data["FileName"][0]
+                latest[name] = (float(data["TimeStamp"][0]), data["Title"][0], data["Document"][0])
+            except (ValueError, KeyError, IndexError, TypeError):
+                continue
+    for name, (_, title, document) in latest.items():
+        if document:
+            yield name, title, document
+
+
+def iter_directory(directory):
+    paths = [os.path.join(directory, f) for f in list_jsonl_files(directory)]
+    for record in iter_documents(paths):
+        if record.document and not record.error:
+            yield record_name(record), record.title, record.document
+
+
+def build_index(sources, out_dir=DEFAULT_INDEX_DIR, workers=1, chunksize=32, keyword_idf=False):
+    # sources 为 (文档名, 题目, 正文) 的迭代器；一遍分词同时统计文档频率和倒排表
+    # keyword_idf 为真时在 meta.json 中标记，分析时的关键词抽取才改用这份领域 IDF
+    names = []
+    postings = {}
+
+    def items():
+        for name, title, document in sources:
+            names.append(name)
+            yield title, document
+
+    if workers == 1:
+        init_index_worker()
+        term_lists = map(document_terms, items())
+        for doc_id, terms in enumerate(term_lists):
+            for term in terms:
+                postings.setdefault(term, []).append(doc_id)
+    else:
+        with multiprocessing.Pool(workers, initializer=init_index_worker) as pool:
+            for doc_id, terms in enumerate(pool.imap(document_terms, items(), chunksize)):
+                for term in terms:
+                    postings.setdefault(term, []).append(doc_id)
+
+    n_docs = len(names)
+    terms = sorted(postings)
+    df = np.array([len(postings[t]) for t in terms], dtype=np.float64)
+    # 平滑 IDF，与 sklearn 的 smooth_idf 相同；未出现过的词取 df = 0 时的值
+    idf = np.log((n_docs + 1) / (df + 1)) + 1
+    ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(df.astype(np.int64), out=ptr[1:])
+    flat = np.fromiter((doc_id for t in terms for doc_id in postings[t]), dtype=np.int32, count=int(ptr[-1]))
+
+    os.makedirs(out_dir, exist_ok=True)
+    terms_array = np.array(terms, dtype=str)
+    np.save(os.path.join(out_dir, "terms.npy"), terms_array)
+    np.save(os.path.join(out_dir, "idf.npy"), idf)
+    np.save(os.path.join(out_dir, "postings_ptr.npy"), ptr)
+    np.save(os.path.join(out_dir, "postings.npy"), flat)
+    with open(os.path.join(out_dir, "documents.json"), "w", encoding="utf-8") as f:
+        json.dump(names, f, ensure_ascii=False)
+    h = hashlib.sha1(terms_array.tobytes())
+    h.update(idf.tobytes())
+    meta = {
+        "documents": n_docs,
+        "terms": len(terms),
+        "default_idf": float(np.log(n_docs + 1) + 1),
+        "version": h.hexdigest(),
+        "keyword_idf": bool(keyword_idf),
+        "created": time.time(),
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    return meta
+
+
+class CorpusIndex:
+    # 只读的倒排索引：词 -> 包含该词的文档
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_dir, "documents.json"), "r", encoding="utf-8") as f:
+            self.documents = json.load(f)
+        self.terms = np.load(os.path.join(index_dir, "terms.npy"), mmap_mode="r")
+        self.idf = np.load(os.path.join(index_dir, "idf.npy"), mmap_mode="r")
+        self.ptr = np.load(os.path.join(index_dir, "postings_ptr.npy"), mmap_mode="r")
+        self.postings = np.load(os.path.join(index_dir, "postings.npy"), mmap_mode="r")
+
+    def _position(self, term):
+        pos = int(np.searchsorted(self.terms, term))
+        if pos < len(self.terms) and self.terms[pos] == term:
+            return pos
+        return -1
+
+    def document_ids(self, term):
+        pos = self._position(term)
+        if pos < 0:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.ptr[pos]:self.ptr[pos + 1]]
+
+    def lookup(self, term):
+        return [self.documents[i] for i in self.document_ids(term)]
+
+    def search(self, terms):
+        # 同时包含全部 terms 的文档
+        ids = None
+        for term in terms:
+            found = self.document_ids(term)
+            ids = found if ids is None else np.intersect1d(ids, found, assume_unique=True)
+        return [self.documents[i] for i in (ids if ids is not None else [])]
+
+    def term_idf(self, term):
+        pos = self._position(term)
+        return float(self.idf[pos]) if pos >= 0 else self.meta["default_idf"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成领域 IDF 表与倒排索引，或在倒排索引中查找文档")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="从文档集合生成索引")
+    build.add_argument("directories", nargs="*", help="包含 .jsonl / .jsonl.gz 文件的目录")
+    build.add_argument("--health", action="store_true", help="同时加入 health_corpus.txt 的每一行")
+    build.add_argument("--results", nargs="*", default=[], help="同时加入以往结果日志中的原文（目录或日志路径）")
+    build.add_argument("-o", "--output", default=DEFAULT_INDEX_DIR, help="索引目录，默认为 model/corpus_index")
+    build.add_argument("-j", "--workers", type=int, default=1, help="分词进程数")
+    build.add_argument("--keyword-idf", action="store_true",
+                       help="分析时用该索引的领域 IDF 代替 jieba 的通用 IDF 抽取关键词（默认只用于 lookup）")
+    lookup = sub.add_parser("lookup", help="查找同时包含给定词语的文档")
+    lookup.add_argument("terms", nargs="+")
+    lookup.add_argument("-i", "--index", default=DEFAULT_INDEX_DIR, help="索引目录")
+    args = parser.parse_args(argv)
+
+    jieba.setLogLevel(jieba.logging.WARNING)
+    if args.command == "lookup":
+        index = CorpusIndex(args.index)
+        for name in index.search(args.terms):
+            print(name)
+        return 0
+
+    def sources():
+        for directory in args.directories:
+            yield from iter_directory(directory)
+        if args.health:
+            yield from iter_health_corpus()
+        for path in args.results:
+            yield from iter_result_documents(result_log_path(path) if os.path.isdir(path) else path)
+
+    if not (args.directories or args.health or args.results):
+        parser.error("至少需要一个文档来源")
+    start = time.time()
+    meta = build_index(sources(), args.output, args.workers, keyword_idf=args.keyword_idf)
+    print(f"索引已保存：{args.output}（{meta['documents']} 篇文档，{meta['terms']} 个词，"
+          f"耗时 {time.time() - start:.1f} 秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
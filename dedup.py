@@ -0,0 +1,153 @@
+import re
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+import nlp_core
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.8
+# 有效字符少于该值的文档只做完全重复检测，MinHash 估计在短文本上误差太大
+MIN_NEAR_CHARS = 50
+# 长文档分块计算 MinHash，限制临时矩阵的大小
+MINHASH_BLOCK = 8192
+# 只保留最近用到的若干篇代表文档（内容哈希、签名、LSH 桶与分析结果），转载通常与原文相距不远
+DEFAULT_MAX_RESULTS = 10000
+
+# 每个排列是一个 multiply-shift 哈希：(a * x + b) mod 2^64 的高 32 位，a 为奇数
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(0, 1 << 62, size=MINHASH_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.randint(0, 1 << 62, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+NON_WORD_RE = re.compile(r'\W+')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def exact_key(title, document):
+    text = WHITESPACE_RE.sub(' ', title).strip() + "\0" + WHITESPACE_RE.sub(' ', document).strip()
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+def shingle_hashes(title, document):
+    # 去掉标点与空白后，每 SHINGLE_SIZE 个连续字符为一个片段，用多项式滚动哈希整体向量化计算
+    text = NON_WORD_RE.sub('', title + document)
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    n = len(codes) - SHINGLE_SIZE + 1
+    if n <= 0:
+        return codes, len(text)
+    # 重复的片段不影响最小值，无需去重
+    hashes = np.zeros(n, dtype=np.uint64)
+    for j in range(SHINGLE_SIZE):
+        hashes = hashes * np.uint64(1000003) + codes[j:j + n]
+    return hashes, len(text)
+
+
+def minhash(hashes):
+    signature = np.full(MINHASH_PERMUTATIONS, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(hashes), MINHASH_BLOCK):
+        block = hashes[start:start + MINHASH_BLOCK]
+        values = (np.outer(block, _PERM_A) + _PERM_B) >> np.uint64(32)
+        np.minimum(signature, values.min(axis=0), out=signature)
+    return signature
+
+
+class Deduplicator:
+    # 批量分析前的去重：完全重复按规整空白后的内容哈希判断，近似重复用 MinHash + LSH 查找候选，
+    # 再以估计的 Jaccard 相似度确认；重复文档不再分析，直接复用代表文档的结果
+    # 代表文档超过 max_results 篇时淘汰最久未用到的一篇，其所有索引与结果一起删除，内存占用有上限
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, max_results=DEFAULT_MAX_RESULTS):
+        self.threshold = threshold
+        self.max_results = max_results
+        self.rows = MINHASH_PERMUTATIONS // LSH_BANDS
+        self.exact = {}
+        self.buckets = [{} for _ in range(LSH_BANDS)]
+        self.signatures = {}
+        self.results = {}
+        # 代表文档名 -> (内容哈希, LSH 分段)，按最近使用排序
+        self.canonicals = OrderedDict()
+        self.documents = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def find(self, name, title, document):
+        # 返回代表文档名；不是重复文档时将其登记为代表文档并返回 None
+        self.documents += 1
+        key = exact_key(title, document)
+        canonical = self.exact.get(key)
+        if canonical is not None:
+            self.exact_duplicates += 1
+            self.canonicals.move_to_end(canonical)
+            return canonical
+
+        hashes, n_chars = shingle_hashes(title, document)
+        signature = minhash(hashes) if n_chars >= MIN_NEAR_CHARS else None
+        bands = None
+        if signature is not None:
+            bands = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(LSH_BANDS)]
+            candidates = []
+            for bucket, band in zip(self.buckets, bands):
+                candidates.extend(bucket.get(band, ()))
+            best, best_similarity = None, self.threshold
+            for candidate in dict.fromkeys(candidates):
+                similarity = float(np.mean(self.signatures[candidate] == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is not None:
+                self.near_duplicates += 1
+                self.canonicals.move_to_end(best)
+                return best
+            for bucket, band in zip(self.buckets, bands):
+                bucket.setdefault(band, []).append(name)
+            self.signatures[name] = signature
+        self.exact[key] = name
+        self.canonicals[name] = (key, bands)
+        while len(self.canonicals) > self.max_results:
+            self.evict(*self.canonicals.popitem(last=False))
+        return None
+
+    def evict(self, name, entry):
+        key, bands = entry
+        if self.exact.get(key) == name:
+            del self.exact[key]
+        if bands is not None:
+            for bucket, band in zip(self.buckets, bands):
+                names = bucket[band]
+                names.remove(name)
+                if not names:
+                    del bucket[band]
+            del self.signatures[name]
+        self.results.pop(name, None)
+
+    def annotate(self, records, name_of):
+        # 为重复记录填上 duplicate_of，读取失败或正文为空的记录原样通过
+        for record in records:
+            if record.document and not record.error:
+                canonical = self.find(name_of(record), record.title, record.document)
+                if canonical is not None:
+                    record = record._replace(duplicate_of=canonical)
+            yield record
+
+    def resolve(self, record, name, result):
+        # 代表文档：记住其结果；重复文档：复用代表文档的结果，只替换题目和原文
+        # 返回 (结果, 所复用的代表文档名)，没有复用其他文档的结果时后者为 None
+        if record.duplicate_of is None:
+            if result and name in self.canonicals:
+                self.results[name] = {k: v for k, v in result.items() if k != "Document"}
+            return result, None
+        canonical = self.results.get(record.duplicate_of)
+        if canonical is None:
+            # 代表文档分析失败或已被淘汰，单独分析，结果不再指向代表文档
+            return nlp_core.analyze_content(record.title, record.document), None
+        return dict(canonical, Title=record.title, Document=record.document), record.duplicate_of
+
+    def stats(self):
+        duplicates = self.exact_duplicates + self.near_duplicates
+        return {
+            "documents": self.documents,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "dedup_ratio": duplicates / self.documents if self.documents else 0.0,
+        }
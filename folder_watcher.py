@@ -0,0 +1,393 @@
+import os
+import sys
+import json
+import time
+import queue
+import ctypes
+import select
+import signal
+import hashlib
+import argparse
+import threading
+import multiprocessing
+
+import nlp_core
+from batch_engine import (CHECKPOINT_INTERVAL, DEFAULT_CHUNKSIZE, failed_path, init_worker, iter_local_results,
+                          iter_pool_results, list_jsonl_files, natural_key, open_pool, result_log_path,
+                          unfinished_job, watch_state_path, write_json_atomic, write_results)
+from jsonl_reader import INPUT_SUFFIXES, iter_records, open_input
+from result_writer import open_result_sink
+
+# 没有 inotify 时两次扫描目录的间隔（秒）
+POLL_INTERVAL = 1.0
+# 末行没有换行符的文件（及 .gz 文件）在这段时间内不再变化才视为写完
+SETTLE_SECONDS = 1.0
+DEFAULT_QUEUE_SIZE = 64
+# 用文件开头的若干字节判断文件是被追加还是被整体改写
+HEAD_BYTES = 4096
+
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+def open_inotify(directory):
+    # 仅 Linux：目录变化时立即唤醒扫描；不可用时返回 None，只靠定时轮询
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(directory), INOTIFY_MASK) < 0:
+            os.close(fd)
+            return None
+    except (OSError, AttributeError):
+        return None
+    return fd
+
+
+def drain_inotify(fd):
+    # 事件内容不重要，读空后重新扫描目录即可
+    while True:
+        try:
+            if not os.read(fd, 65536):
+                return
+        except BlockingIOError:
+            return
+
+
+def file_head(path, length):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+def read_extent(path):
+    # 返回 (读取位置, 行数)，与 iter_records 读完整个文件后的 next_offset / line_no 一致
+    offset = lines = 0
+    last = b"\n"
+    with open_input(path) as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            offset += len(block)
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return offset, lines + (last != b"\n")
+
+
+class FolderWatcher:
+    # 持续监视目录，只分析新增或修改的 JSONL 文件中新增的部分，结果追加到已有的结果文件
+    #   扫描线程比较文件的大小、修改时间与 inode 发现变化（Linux 上由 inotify 即时唤醒，其余平台定时轮询），
+    #   把文件名放入有界队列，分析跟不上时扫描线程等待；每个文件记录已读取到的位置，追加的内容从该位置继续读，
+    #   开头被改写、文件变短或被替换时从头重新分析
+    #   正在写入的文件只读取完整的行，末行的换行符缺失时等文件 settle 秒不再变化后再读；.gz 文件整体等待写完
+    #   状态在结果 fsync 之后保存，异常退出后最多重复分析最后一段，结果文件中以最新的记录为准
+
+    def __init__(self, directory, save_path=None, workers=1, chunksize=DEFAULT_CHUNKSIZE, cache_path=None,
+                 memory_budget=None, interval=POLL_INTERVAL, settle=SETTLE_SECONDS, queue_size=DEFAULT_QUEUE_SIZE,
+                 checkpoint_interval=CHECKPOINT_INTERVAL, progress=None, on_batch=None):
+        self.directory = directory
+        self.save_path = save_path or result_log_path(directory)
+        self.state_path = watch_state_path(self.save_path)
+        self.failed_path = failed_path(self.save_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.cache_path = cache_path
+        self.memory_budget = memory_budget
+        self.interval = interval
+        self.settle = settle
+        self.checkpoint_interval = checkpoint_interval
+        self.progress = progress
+        self.on_batch = on_batch
+        self.queue = queue.Queue(queue_size)
+        self.queued = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        # 扫描线程看到的文件状态：文件名 -> [(大小, 修改时间, inode), 是否已稳定]
+        self.seen = {}
+        # files 为每个文件已读取到的位置，随结果一起保存；计数为累计值
+        self.state = {"files": {}, "total": 0, "success": 0, "failed": 0}
+        self.pool = None
+        self.failed_file = None
+        self.last_checkpoint = time.monotonic()
+
+    def load(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.state.update({k: state[k] for k in self.state if k in state})
+        return True
+
+    def baseline(self):
+        # 已有文件视为已分析，只处理此后新增或修改的内容
+        for name in list_jsonl_files(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+                offset, line = read_extent(path)
+                head_len = min(st.st_size, HEAD_BYTES)
+                self.state["files"][name] = {"ino": st.st_ino, "size": st.st_size, "offset": offset, "line": line,
+                                             "head": file_head(path, head_len), "head_len": head_len}
+            except (OSError, EOFError):
+                continue
+
+    def save(self, sink):
+        sink.checkpoint()
+        self.failed_file.flush()
+        os.fsync(self.failed_file.fileno())
+        write_json_atomic(self.state_path, dict(self.state, updated=time.time()))
+        self.last_checkpoint = time.monotonic()
+
+    def stop(self):
+        self.stopped.set()
+
+    # 扫描线程
+
+    def enqueue(self, name):
+        with self.lock:
+            if name in self.queued:
+                return
+            self.queued.add(name)
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(name, timeout=self.interval)
+                return
+            except queue.Full:
+                continue
+
+    def scan(self):
+        now = time.time()
+        present = set()
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(INPUT_SUFFIXES):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            present.add(entry.name)
+            key = (st.st_size, st.st_mtime_ns, st.st_ino)
+            settled = now - st.st_mtime >= self.settle
+            seen = self.seen.get(entry.name)
+            if seen is None or seen[0] != key:
+                self.seen[entry.name] = [key, settled]
+                self.enqueue(entry.name)
+            elif settled and not seen[1]:
+                # 写入停止后再处理一次，读取没有换行符的末行
+                seen[1] = True
+                self.enqueue(entry.name)
+        for name in list(self.seen):
+            if name not in present:
+                del self.seen[name]
+                self.enqueue(name)
+
+    def scan_loop(self):
+        fd = open_inotify(self.directory)
+        try:
+            while not self.stopped.is_set():
+                try:
+                    self.scan()
+                except OSError as e:
+                    nlp_core.logger.warning("扫描目录失败：%s", e)
+                if fd is None:
+                    self.stopped.wait(self.interval)
+                elif select.select([fd], [], [], self.interval)[0]:
+                    drain_inotify(fd)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    # 分析线程
+
+    def unchanged_prefix(self, path, st, state):
+        # 同一个文件且只在末尾追加了内容
+        if state["ino"] != st.st_ino or st.st_size < state["size"]:
+            return False
+        if not path.endswith(".gz") and st.st_size < state["offset"]:
+            return False
+        return file_head(path, state["head_len"]) == state["head"]
+
+    def delta_records(self, names, stats):
+        for name in sorted(names, key=natural_key):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self.state["files"].pop(name, None)
+                continue
+            settled = time.time() - st.st_mtime >= self.settle
+            gz = name.endswith(".gz")
+            if gz and not settled:
+                continue
+            try:
+                state = self.state["files"].get(name)
+                if state is None or not self.unchanged_prefix(path, st, state):
+                    state = self.state["files"][name] = {"ino": st.st_ino, "size": 0, "offset": 0, "line": 0}
+                elif gz and st.st_size == state["size"]:
+                    continue
+                head_len = min(st.st_size, HEAD_BYTES)
+                state.update(ino=st.st_ino, size=st.st_size, head=file_head(path, head_len), head_len=head_len)
+            except OSError:
+                continue
+            # 移入目录的文件保留原来的修改时间，到达时间取修改时间与 ctime 中较晚的一个；
+            # 只统计确实读出了新记录的文件，没有变化的文件不影响延迟
+            arrived = max(st.st_mtime, st.st_ctime)
+            for record in iter_records(path, state["offset"], state["line"], complete_only=not (gz or settled)):
+                if self.stopped.is_set():
+                    # 停止时不再读取，剩余部分下次从保存的位置继续
+                    return
+                if arrived is not None:
+                    stats["arrived"] = min(stats.get("arrived", arrived), arrived)
+                    arrived = None
+                stats["records"] += 1
+                yield record
+
+    def fail(self, record, error, detail=None):
+        entry = {"source": record.source, "line_no": record.line_no, "title": record.title, "error": error,
+                 "detail": detail, "time": time.time()}
+        self.failed_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.state["failed"] += 1
+
+    def advance(self, record, sink, success):
+        # 与 BatchJob.advance 相同的接口，供 write_results 调用
+        self.state["total"] += 1
+        self.state["success"] += bool(success)
+        state = self.state["files"].get(record.source)
+        if state is not None:
+            state.update(offset=record.next_offset, line=record.line_no)
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.save(sink)
+
+    def process(self, names, sink, stats):
+        records = self.delta_records(names, stats)
+        if self.pool is None:
+            results = iter_local_results(records, self.chunksize)
+        else:
+            results = iter_pool_results(self.pool, records, self.workers * 2, self.chunksize)
+        try:
+            write_results(self, sink, results, self.progress)
+        except (OSError, EOFError) as e:
+            # 文件在读取过程中被删除或截断，下次扫描时重新处理
+            nlp_core.logger.warning("读取文件失败：%s", e)
+
+    def next_batch(self):
+        try:
+            names = [self.queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                names.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        with self.lock:
+            self.queued.difference_update(names)
+        return names
+
+    def run(self, skip_existing=False, once=False):
+        # once 为真时只处理当前已有的变化后返回；否则持续监视直到 stop()
+        if unfinished_job(self.directory, self.save_path):
+            raise RuntimeError("上次的批量任务尚未完成，请先续跑（--resume）")
+        if not self.load() and skip_existing:
+            self.baseline()
+        if self.workers == 1:
+            init_worker(self.cache_path, None, self.memory_budget)
+        else:
+            self.pool = open_pool(self.workers, self.cache_path, None, self.memory_budget)
+        os.makedirs(os.path.dirname(os.path.abspath(self.failed_path)), exist_ok=True)
+        self.failed_file = open(self.failed_path, "a", encoding="utf-8")
+        scanner = None
+        try:
+            with open_result_sink(self.save_path) as sink:
+                try:
+                    stats = {"records": 0}
+                    if once:
+                        self.process(set(list_jsonl_files(self.directory)) | set(self.state["files"]), sink, stats)
+                        self.finish_batch(sink, stats)
+                        return
+                    scanner = threading.Thread(target=self.scan_loop, daemon=True)
+                    scanner.start()
+                    while not self.stopped.is_set():
+                        names = self.next_batch()
+                        if names:
+                            self.process(names, sink, stats)
+                            if self.queue.empty():
+                                self.finish_batch(sink, stats)
+                                stats = {"records": 0}
+                finally:
+                    self.save(sink)
+        finally:
+            self.stopped.set()
+            if scanner is not None:
+                scanner.join()
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool = None
+            self.failed_file.close()
+
+    def finish_batch(self, sink, stats):
+        # 队列已空：写出结果并保存状态，延迟从最早到达的文件算起
+        self.save(sink)
+        if self.on_batch and stats["records"]:
+            self.on_batch(stats["records"], time.time() - stats["arrived"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="监视目录，增量分析新增或修改的 JSONL 文件并追加到结果文件（无界面）")
+    parser.add_argument("directory", help="包含 .jsonl / .jsonl.gz 文件的目录")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="工作进程数，默认在当前进程内分析")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="每次分发给工作进程的文档数，同时也是分类器的批大小")
+    parser.add_argument("-o", "--output", default=None,
+                        help="结果文件路径，默认为 <目录>/result/result_log.jsonl；以 .rlog 结尾时写入紧凑的二进制结果日志")
+    parser.add_argument("--cache", default=None, help="分析结果磁盘缓存（SQLite）路径")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="单篇文档分词中间结果的内存上限（MB），超长文档按相应大小的窗口流式分析")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="轮询目录的间隔（秒）")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="末行没有换行符的文件及 .gz 文件在多少秒内不再变化后视为写完")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="待分析文件队列的长度上限")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="首次监视时把目录中已有的文件视为已分析，只处理此后新增或修改的内容")
+    parser.add_argument("--once", action="store_true", help="只处理当前已有的变化，处理完即退出")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"目录不存在：{args.directory}")
+        return 1
+
+    def on_batch(count, latency):
+        print(f"{time.strftime('%H:%M:%S')} 分析 {count} 篇，延迟 {latency:.1f} 秒", flush=True)
+
+    memory_budget = int(args.memory_budget * (1 << 20)) if args.memory_budget else None
+    watcher = FolderWatcher(args.directory, args.output, args.workers, args.chunksize, args.cache, memory_budget,
+                            args.interval, args.settle, args.queue_size, on_batch=on_batch)
+    if not args.once:
+        # 作为后台服务运行时收到 SIGTERM 也正常保存状态后退出
+        signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+        print(f"正在监视：{args.directory}（Ctrl+C 停止）", flush=True)
+    try:
+        watcher.run(args.skip_existing, args.once)
+    except RuntimeError as e:
+        print(e)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    state = watcher.state
+    print(f"累计成功分析：{state['success']}/{state['total']}篇文档")
+    if state["failed"]:
+        print(f"失败 {state['failed']} 篇，详情见：{watcher.failed_path}（可用 batch_engine.py --retry-failed 重试）")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import os
+import gzip
+import json
+from collections import namedtuple
+
+# next_offset 为该行之后的字节偏移（gzip 文件为解压后的偏移），可用于断点续读
+# duplicate_of 由去重阶段填写，为重复记录所对应的代表文档名
+DocumentRecord = namedtuple("DocumentRecord",
+                            ["source", "line_no", "title", "document", "next_offset", "error", "duplicate_of"],
+                            defaults=(None,))
+
+INPUT_SUFFIXES = (".jsonl", ".jsonl.gz")
+
+
+def parse_record(data):
+    title = data.get("title") or data.get("Title") or ""
+    document = data.get("content") or data.get("Content") or data.get("Document") or ""
+    return title, document
+
+
+def open_input(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_records(path, offset=0, line_no=0, complete_only=False):
+    # complete_only 为真时遇到没有换行符的末行即停止（文件可能仍在写入），offset 停在该行之前
+    source = os.path.basename(path)
+    with open_input(path) as f:
+        if offset:
+            f.seek(offset)
+        for raw in f:
+            if complete_only and not raw.endswith(b"\n"):
+                break
+            offset += len(raw)
+            line_no += 1
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line.decode("utf-8"))
+                title, document = parse_record(data)
+            except (ValueError, AttributeError) as e:
+                yield DocumentRecord(source, line_no, "", "", offset, f"{type(e).__name__}: {e}")
+                continue
+            yield DocumentRecord(source, line_no, title, document, offset, None)
+
+
+def iter_documents(paths, start_source=None, start_offset=0, start_line=0):
+    # 按顺序惰性读取所有文件的所有行；指定 start_source 时从该文件的 start_offset 处继续
+    started = start_source is None
+    for path in paths:
+        if not started:
+            if os.path.basename(path) != start_source:
+                continue
+            started = True
+            yield from iter_records(path, start_offset, start_line)
+            continue
+        yield from iter_records(path)
+
+
+def read_document(path):
+    for record in iter_records(path):
+        if record.error:
+            raise ValueError(record.error)
+        return record.title, record.document
+    raise ValueError("文件为空")
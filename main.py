@@ -1,11 +1,22 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
+from tkinter import filedialog, messagebox, scrolledtext, ttk
 import os
-import json
 import time
 import threading
-import re
-from nlp_core import analyze_content
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import nlp_core
+from analysis_cache import AnalysisCache
+from batch_engine import (BatchJob, clear_job, list_jsonl_files, result_line, result_log_path, run_batch,
+                          unfinished_job, watch_state_path)
+from folder_watcher import FolderWatcher
+from jsonl_reader import read_document
+from result_store import open_result_store
+
+# 批量分析进度刷新的最小间隔（秒）
+PROGRESS_INTERVAL = 0.2
+# 停止监视时等待监视线程保存状态的最长时间（秒）
+WATCH_STOP_TIMEOUT = 10
 
 
 class DocumentAnalyzerApp:
@@ -16,6 +27,16 @@ class DocumentAnalyzerApp:
         self.current_dir = ""
         self.file_list = []
         self.current_file_idx = -1
+        self.result_store = None
+        self.analysis_cache = AnalysisCache()
+        # 分析在后台线程中进行，界面线程只负责显示；切换文件后旧请求直接作废
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        self.request_id = 0
+        self.pending = None
+        self.prefetching = []
+        self.watcher = None
+        self.watch_thread = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -24,6 +45,8 @@ class DocumentAnalyzerApp:
         tk.Button(top_frame, text="选择目录", command=self.select_dir).pack(side=tk.LEFT)
         self.path_label = tk.Label(top_frame, text="未选择目录...", fg="grey", padx=10)
         self.path_label.pack(side=tk.LEFT)
+        self.status_label = tk.Label(top_frame, text="", fg="grey")
+        self.status_label.pack(side=tk.RIGHT)
 
         main_body = tk.Frame(self.root)
         main_body.pack(fill=tk.BOTH, expand=True, padx=10)
@@ -47,6 +70,13 @@ class DocumentAnalyzerApp:
         self.batch_btn = tk.Button(bottom_left_frame, text="开始批量分析",
                                    command=self.batch_analyze, bg="#bbdefb", height=2, font=("微软雅黑", 10))
         self.batch_btn.pack(fill=tk.X, padx=2)
+        self.watch_btn = tk.Button(bottom_left_frame, text="开始监视目录", command=self.toggle_watch,
+                                   font=("微软雅黑", 10))
+        self.watch_btn.pack(fill=tk.X, padx=2, pady=(5, 0))
+        self.progress_bar = ttk.Progressbar(bottom_left_frame, mode="determinate")
+        self.progress_bar.pack(fill=tk.X, padx=2, pady=(5, 0))
+        self.progress_label = tk.Label(bottom_left_frame, text="", fg="grey", anchor="w")
+        self.progress_label.pack(fill=tk.X, padx=2)
 
         right_panel = tk.Frame(main_body)
         right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
@@ -87,39 +117,45 @@ class DocumentAnalyzerApp:
         self.raw_text = scrolledtext.ScrolledText(right_panel, height=12, bg="#f5f5f5", font=("微软雅黑", 9))
         self.raw_text.pack(fill=tk.BOTH, expand=True, pady=5)
 
-    def result_append(self, file, D_Mark, FileName, Title, KeyWord_HFWord, ClassLabel, NamedEntity, Abstract, Document):
-        one_result = {}
-        timestamp = time.time()
-        one_result["TimeStamp"] = [str(timestamp)]
-        one_result["D_Mark"] = [D_Mark]
-        one_result["FileName"] = [FileName]
-        one_result["Title"] = [Title]
-        one_result["KeyWord_HFWord"] = [KeyWord_HFWord]
-        one_result["ClassLabel"] = [ClassLabel]
-        one_result["NamedEntity"] = [NamedEntity]
-        one_result["Abstract"] = [Abstract]
-        one_result["Document"] = [Document]
-        result_string = json.dumps(one_result, ensure_ascii=False) + "\n"
-        file.writelines(result_string)
-
     def select_dir(self):
         path = filedialog.askdirectory()
         if path:
             if os.path.basename(path) != "examples":
                 messagebox.showerror("错误", "请选择名为'examples'的目录！")
                 return
+            self.stop_watch()
             self.current_dir = path
             self.path_label.config(text=path)
-            self.file_list = [f for f in os.listdir(path) if f.endswith(".jsonl")]
-            self.file_list.sort(key=lambda x: [int(c) if c.isdigit() else c.lower() for c in re.split('([0-9]+)', x)])
+            self.file_list = list_jsonl_files(path)
             self.file_listbox.delete(0, tk.END)
             for f in self.file_list:
                 self.file_listbox.insert(tk.END, f)
 
-            result_dir = os.path.join(path, "result")
-            result_file = os.path.join(result_dir, "result_log.jsonl")
-            if os.path.exists(result_file):
-                os.remove(result_file)
+            if self.result_store:
+                self.result_store.close()
+            save_path = result_log_path(path)
+            self.result_store = open_result_store(save_path)
+            # 上次的批量分析中断时可保留已有结果，点击"开始批量分析"从检查点继续
+            # 监视过的目录同样可保留结果，再次监视时只分析新增或修改的文件
+            state = unfinished_job(path, save_path)
+            if state:
+                keep = messagebox.askyesno(
+                    "继续批量分析", f"上次的批量分析未完成（已处理 {state['total']} 篇），是否保留已有结果并继续？")
+            else:
+                keep = os.path.exists(watch_state_path(save_path)) and messagebox.askyesno(
+                    "继续监视", "该目录上次处于监视状态，是否保留已有结果？")
+            if not keep:
+                self.result_store.clear()
+                clear_job(save_path)
+            self.cancel_requests()
+
+    def cancel_requests(self):
+        self.request_id += 1
+        if self.pending:
+            self.pending.cancel()
+        for future in self.prefetching:
+            future.cancel()
+        self.prefetching = []
 
     def on_file_select(self, event):
         selection = self.file_listbox.curselection()
@@ -128,69 +164,65 @@ class DocumentAnalyzerApp:
         self.current_file_idx = selection[0]
         filename = self.file_list[self.current_file_idx]
 
+        self.cancel_requests()
+        request_id = self.request_id
+        self.status_label.config(text=f"正在分析：{filename}")
+        self.pending = self.executor.submit(self.load_result, self.current_dir, filename, request_id)
+        self.pending.add_done_callback(lambda future: self.root.after(0, self.show_result, future, request_id))
+
+    def saved_result(self, filename, document):
+        # 优先显示最新的人工修改记录，其次是批量分析的结果
+        saved_data = (self.result_store.latest(filename, "M") or
+                      self.result_store.latest(filename, "A"))
+        if not saved_data:
+            return None
+        return {
+            "Title": saved_data.get("Title", [""])[0],
+            "ClassLabel": saved_data.get("ClassLabel", [""])[0],
+            "KeyWord_HFWord": saved_data.get("KeyWord_HFWord", [""])[0],
+            "NamedEntity": saved_data.get("NamedEntity", [""])[0],
+            "Abstract": saved_data.get("Abstract", [""])[0],
+            "Document": saved_data.get("Document", [document])[0]
+        }
+
+    def load_result(self, directory, filename, request_id):
+        # 在后台线程中执行；返回 (结果, 原文)，请求已过期或文档为空时返回 None
+        if request_id != self.request_id:
+            return None
+        title, document = read_document(os.path.join(directory, filename))
+        if not document:
+            return None
+        result = self.saved_result(filename, document)
+        if result:
+            return result, result["Document"]
+        return self.analysis_cache.analyze(title, document), document
+
+    def show_result(self, future, request_id):
+        if future.cancelled() or request_id != self.request_id:
+            return
+        self.status_label.config(text="")
         try:
-
-            with open(os.path.join(self.current_dir, filename), "r", encoding="utf-8") as f:
-                json_line = f.readline().strip()
-                data = json.loads(json_line)
-                title = data.get("title") or data.get("Title") or ""
-                document = data.get("content") or data.get("Content") or data.get("Document") or ""
-
-            if not document:
-                return
-
-
-            result_file_path = os.path.join(self.current_dir, "result", "result_log.jsonl")
-            modified_data = None
-            latest_timestamp = 0
-
-            if os.path.exists(result_file_path):
-                with open(result_file_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        line = line.strip()
-                        if not line:
-                            continue
-
-                        try:
-                            result_data = json.loads(line)
-                            # 检查是否是当前文件且是人工修改记录
-                            if (result_data.get("FileName", [""])[0] == filename and
-                                    result_data.get("D_Mark", [""])[0] == "M"):
-
-                                # 提取时间戳
-                                ts_str = result_data.get("TimeStamp", ["0"])[0]
-                                try:
-                                    timestamp = float(ts_str)
-                                except:
-                                    timestamp = 0
-
-                                # 保存最新的修改记录
-                                if timestamp > latest_timestamp:
-                                    latest_timestamp = timestamp
-                                    modified_data = result_data
-                        except:
-                            continue
-
-
-            if modified_data:
-
-                result_for_display = {
-                    "Title": modified_data.get("Title", [""])[0],
-                    "ClassLabel": modified_data.get("ClassLabel", [""])[0],
-                    "KeyWord_HFWord": modified_data.get("KeyWord_HFWord", [""])[0],
-                    "NamedEntity": modified_data.get("NamedEntity", [""])[0],
-                    "Abstract": modified_data.get("Abstract", [""])[0],
-                    "Document": modified_data.get("Document", [document])[0]
-                }
-                self.fill_fields(result_for_display, result_for_display["Document"])
-            else:
-
-                res = analyze_content(title, document)
-                if res:
-                    self.fill_fields(res, document)
-
+            loaded = future.result()
         except Exception as e:
             messagebox.showerror("错误", f"读取文件失败：{str(e)}")
+            return
+        if loaded and loaded[0]:
+            self.fill_fields(*loaded)
+        self.prefetch_neighbours(self.current_file_idx, request_id)
+
+    def prefetch_neighbours(self, idx, request_id):
+        # 预先分析"下一篇"/"上一篇"将打开的文件，结果进入分析缓存
+        for i in (idx + 1, idx - 1):
+            if 0 <= i < len(self.file_list):
+                self.prefetching.append(self.prefetch_executor.submit(
+                    self.prefetch, self.current_dir, self.file_list[i], request_id))
+
+    def prefetch(self, directory, filename, request_id):
+        if request_id != self.request_id:
+            return
+        title, document = read_document(os.path.join(directory, filename))
+        if document and not self.saved_result(filename, document):
+            self.analysis_cache.analyze(title, document)
 
     def fill_fields(self, data, original_doc):
         for key, widget in self.fields.items():
@@ -207,8 +239,6 @@ class DocumentAnalyzerApp:
         if self.current_file_idx == -1:
             messagebox.showwarning("提示", "请先选择要保存的文件！")
             return
-        save_path = os.path.join(self.current_dir, "result", "result_log.jsonl")
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
         filename = self.file_list[self.current_file_idx]
         title = self.fields["Title"].get().strip()
         key_hf = self.fields["KeyWord_HFWord"].get().strip()
@@ -216,43 +246,139 @@ class DocumentAnalyzerApp:
         entity = self.fields["NamedEntity"].get().strip()
         abstract = self.fields["Abstract"].get("1.0", tk.END).strip()
         document = self.raw_text.get("1.0", tk.END).strip()
-        with open(save_path, "a", encoding="utf-8") as f:
-            self.result_append(f, "M", filename, title, key_hf, class_label, entity, abstract, document)
+        self.result_store.append(result_line("M", filename, title, key_hf, class_label, entity, abstract, document))
+        threading.Thread(target=self.learn_corrections, args=(self.result_store.path,), daemon=True).start()
         messagebox.showinfo("成功", "人工修改结果已保存")
 
+    def learn_corrections(self, log_path):
+        # 后台用新保存的人工修正增量更新分类模型，完成后新模型立即用于后续分析
+        try:
+            import online_learning
+            online_learning.get_learner().update(log_path)
+        except Exception as e:
+            nlp_core.logger.warning("增量更新分类模型失败：%s", e)
+
     def batch_analyze(self):
         if not self.file_list:
             messagebox.showwarning("提示", "请先选择包含JSONL文件的examples目录！")
             return
-        save_path = os.path.join(self.current_dir, "result", "result_log.jsonl")
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        if self.watcher:
+            messagebox.showwarning("提示", "请先停止监视目录！")
+            return
+        save_path = self.result_store.path
         self.batch_btn.config(state=tk.DISABLED, text="分析中...")
+        file_index = {f: i for i, f in enumerate(self.file_list, 1)}
+        self.progress_bar.config(maximum=len(self.file_list), value=0)
+        self.progress_label.config(text="")
+        start = time.perf_counter()
+        last_update = [0.0]
+
+        def progress(done, record):
+            now = time.perf_counter()
+            if now - last_update[0] >= PROGRESS_INTERVAL:
+                last_update[0] = now
+                self.root.after(0, self.show_progress, done, file_index.get(record.source, 0), now - start)
 
         def task():
-            success_count = 0
-            for fname in self.file_list:
-                try:
-                    with open(os.path.join(self.current_dir, fname), "r", encoding="utf-8") as f_in:
-                        json_line = f_in.readline().strip()
-                        data = json.loads(json_line)
-                        title = data.get("title") or data.get("Title") or ""
-                        document = data.get("content") or data.get("Content") or data.get("Document") or ""
-                        if document:
-                            res = analyze_content(title, document)
-                            if res:
-                                with open(save_path, "a", encoding="utf-8") as f_out:
-                                    self.result_append(f_out, "A", fname, res["Title"], res["KeyWord_HFWord"],
-                                                       res["ClassLabel"], res["NamedEntity"], res["Abstract"], document)
-                                success_count += 1
-                except Exception as e:
-                    continue
+            job = BatchJob(self.current_dir, save_path, self.file_list)
+            try:
+                success_count, total = run_batch(self.current_dir, self.file_list, save_path=save_path,
+                                                 progress=progress, resume=True, job=job)
+            except Exception as e:
+                # 已处理的部分保存在检查点中，再次点击即可继续
+                error = f"{type(e).__name__}: {e}"
+                self.root.after(0, lambda: [
+                    messagebox.showerror("批量分析中断", f"{error}\n再次点击可从中断处继续"),
+                    self.batch_btn.config(state=tk.NORMAL, text="开始批量分析")
+                ])
+                return
+            elapsed = time.perf_counter() - start
+            self.result_store.refresh()
+            message = f"处理结束！\n成功分析：{success_count}/{total}篇文档"
+            if job.state["failed"]:
+                message += f"\n失败 {job.state['failed']} 篇，详情见：{job.failed_path}"
             self.root.after(0, lambda: [
-                messagebox.showinfo("批量分析完成", f"处理结束！\n成功分析：{success_count}/{len(self.file_list)}个文件"),
+                self.show_progress(total, len(self.file_list), elapsed),
+                messagebox.showinfo("批量分析完成", message),
                 self.batch_btn.config(state=tk.NORMAL, text="开始批量分析")
             ])
 
         threading.Thread(target=task).start()
 
+    def toggle_watch(self):
+        if self.watcher:
+            self.stop_watch()
+            return
+        if not self.current_dir:
+            messagebox.showwarning("提示", "请先选择包含JSONL文件的examples目录！")
+            return
+        if str(self.batch_btn["state"]) == tk.DISABLED:
+            messagebox.showwarning("提示", "请等待批量分析结束！")
+            return
+
+        # 停止监视时界面线程在等待监视线程退出，此后不再回调界面
+        def progress(done, record):
+            if record.source not in self.file_list and not watcher.stopped.is_set():
+                self.root.after(0, self.add_file, record.source)
+
+        def on_batch(count, latency):
+            if not watcher.stopped.is_set():
+                self.root.after(0, lambda: self.progress_label.config(
+                    text=f"监视中：新分析 {count} 篇，延迟 {latency:.1f} 秒"))
+
+        # 首次监视时已有文件视为已分析（可先批量分析），之后只分析新增或修改的内容
+        watcher = FolderWatcher(self.current_dir, self.result_store.path, progress=progress, on_batch=on_batch)
+
+        def task():
+            try:
+                watcher.run(skip_existing=True)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                self.root.after(0, lambda: [
+                    messagebox.showerror("监视目录失败", error),
+                    self.watch_stopped(watcher)
+                ])
+
+        self.watcher = watcher
+        self.watch_thread = threading.Thread(target=task, daemon=True)
+        self.watch_thread.start()
+        self.batch_btn.config(state=tk.DISABLED)
+        self.watch_btn.config(text="停止监视目录")
+        self.progress_label.config(text="监视中：等待新文件...")
+
+    def stop_watch(self):
+        # 等待监视线程写完当前一组结果并保存状态
+        if self.watcher:
+            watcher, thread = self.watcher, self.watch_thread
+            watcher.stop()
+            self.watch_stopped(watcher)
+            thread.join(WATCH_STOP_TIMEOUT)
+
+    def watch_stopped(self, watcher):
+        if watcher is not self.watcher:
+            return
+        self.watcher = None
+        self.watch_thread = None
+        self.batch_btn.config(state=tk.NORMAL)
+        self.watch_btn.config(text="开始监视目录")
+        self.progress_label.config(text="")
+
+    def add_file(self, filename):
+        if filename not in self.file_list:
+            self.file_list.append(filename)
+            self.file_listbox.insert(tk.END, filename)
+
+    def show_progress(self, done, files_done, elapsed):
+        self.progress_bar.config(value=files_done)
+        rate = done / elapsed if elapsed else 0.0
+        self.progress_label.config(text=f"已分析 {done} 篇（文件 {files_done}/{len(self.file_list)}），{rate:.1f} 篇/秒")
+
+    def shutdown(self):
+        self.stop_watch()
+        self.cancel_requests()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+
     def prev_file(self):
         if self.current_file_idx > 0:
             self.file_listbox.selection_clear(0, tk.END)
@@ -269,6 +395,9 @@ class DocumentAnalyzerApp:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    nlp_core.preload(background=True)
     root = tk.Tk()
     app = DocumentAnalyzerApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.shutdown()
\ No newline at end of file
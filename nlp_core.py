@@ -1,11 +1,21 @@
 import os
 import sys
 import re
+import time
+import json
+import bisect
+import hashlib
+import logging
+import threading
 import jieba
 import jieba.posseg as pseg
 import jieba.analyse
+from jieba import finalseg
 from collections import Counter
+from contextlib import nullcontext
+from functools import lru_cache
 import joblib
+import numpy as np
 
 
 def get_resource_path(relative_path):
@@ -14,11 +24,90 @@ def get_resource_path(relative_path):
     return os.path.join(os.path.abspath("."), relative_path)
 
 
+def get_data_path(relative_path):
+    # 运行时会写入的文件：打包后的 _MEIPASS 是退出即删除的临时解压目录，改放到用户数据目录
+    if hasattr(sys, '_MEIPASS'):
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".local", "share")
+        return os.path.join(base, "DocumentAnalyzer", relative_path)
+    return os.path.join(os.path.abspath("."), relative_path)
+
+
 MODEL_PATH = get_resource_path("model/text_classifier_5cat.pkl")
 STOPWORDS_PATH = get_resource_path("stopwords.txt")
+# train_classifier.py 导出的精简推理模型，存在时优先使用，无需加载 sklearn
+COMPACT_MODEL_DIR = get_resource_path("model/compact")
+USE_COMPACT_MODEL = True
+# online_learning.py 根据人工修正增量更新的模型快照，存在且与基础模型匹配时叠加在基础模型之上
+ONLINE_MODEL_DIR = get_data_path("model/online")
+USE_ONLINE_MODEL = True
+# corpus_index.py 从文档集合生成的领域 IDF 表与倒排索引；只有生成时指定了 --keyword-idf（meta.json 中 keyword_idf 为真），
+# 关键词抽取才用它代替 jieba 自带的通用 IDF，只为 lookup 生成的索引不影响分析结果
+KEYWORD_INDEX_DIR = get_resource_path("model/corpus_index")
+USE_KEYWORD_INDEX = True
+# 领域实体词典：目录下每个 .txt 文件一行一个实体名（药品、学校、游戏名等），存在时与词性实体按出现位置合并
+GAZETTEER_DIR = get_resource_path("model/gazetteer")
+USE_GAZETTEER = True
+# 打包前生成的 jieba 前缀词典缓存，随程序打包；没有时 jieba 生成的缓存写到可写的数据目录，下次启动直接读取
+JIEBA_CACHE_PATH = get_resource_path("model/jieba.cache")
+JIEBA_CACHE_FALLBACK = get_data_path("model/jieba.cache")
+
+KEYWORD_POS = ('n', 'nr', 'ns', 'nt', 'nz', 'vn', 'v')
+ENTITY_POS = ('nr', 'ns', 'nt')
+ENTITY_LIMIT = 5
+# 单独抽取实体时逐窗口分词，前 ENTITY_LIMIT 个实体都已找到后不再处理后面的正文
+ENTITY_WINDOW_CHARS = 512
+# 整批做词典匹配时连接各篇正文的分隔符：词典词条一行一个，不含换行，命中不会跨越两篇正文
+BATCH_SEPARATOR = " \n"
+
+# 超长正文按窗口流式分词，只保留累加的词频与实体，分词中间结果的内存不超过 ANALYSIS_MEMORY_BUDGET 字节
+# 分词结果每字约占 STREAM_BYTES_PER_CHAR 字节，据此换算窗口长度；正文超过一个窗口时使用流式分析
+ANALYSIS_MEMORY_BUDGET = 32 << 20
+STREAM_BYTES_PER_CHAR = 100
+MIN_STREAM_WINDOW = 4096
+# 窗口只在 jieba 分块字符集之外的字符（标点、空白等）之后切开，各窗口分词结果拼接起来与整篇分词相同；
+# '\r' 除外，"\r\n" 会被当作一个词
+WINDOW_BREAK_RE = re.compile(r'[^\u4E00-\u9FD5a-zA-Z0-9+#&\._%\-\r]')
+
+# 摘要抽取：逐句打分的句数上限，以及其后按关键词定位打分的句数上限
+ABSTRACT_HEAD_SENTENCES = 15
+ABSTRACT_MAX_EXTRA_SENTENCES = 500
+ANSWER_INDICATORS = ('是', '因为', '由于', '建议', '方法', '做法', '原因', '通过', '可以', '导致')
+NOISE_WORDS = ('来源', '点击', '下载', '作者', '卖家', '转载')
+ANSWER_INDICATOR_RE = re.compile('|'.join(ANSWER_INDICATORS))
+NOISE_WORD_RE = re.compile('|'.join(NOISE_WORDS))
+SENTENCE_END_RE = re.compile(r'[。！？?]')
+LAST_SENTENCE_END_RE = re.compile(r'.*[。！？?]', re.S)
+WHITESPACE_RE = re.compile(r'\s+')
+TITLE_STRIP_RE = re.compile(r'[？?\s]')
 
 classifier = None
+keyword_idf = None
+keyword_idf_checked = False
+gazetteer = None
+gazetteer_checked = False
 stopwords_cache = None
+resource_versions = {}
+load_metrics = {}
+load_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+
+def set_jieba_cache():
+    if os.path.exists(JIEBA_CACHE_PATH):
+        jieba.dt.cache_file = JIEBA_CACHE_PATH
+        return
+    cache_dir = os.path.dirname(JIEBA_CACHE_FALLBACK)
+    if hasattr(sys, '_MEIPASS'):
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError:
+            return
+    if os.path.isdir(cache_dir):
+        jieba.dt.cache_file = JIEBA_CACHE_FALLBACK
+
+
+set_jieba_cache()
 
 
 def load_stopwords():
@@ -33,42 +122,680 @@ def load_stopwords():
     return stopwords_cache
 
 
-def get_best_abstract(title, document, max_len=200):
-    if not document: return ""
+class CompactClassifier:
+    # 与 TfidfVectorizer + LogisticRegression 流水线等价的 numpy 实现
+
+    def __init__(self, model_dir):
+        with open(os.path.join(model_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.vocab = np.load(os.path.join(model_dir, "vocab.npy"), mmap_mode="r")
+        self.idf = np.load(os.path.join(model_dir, "idf.npy"), mmap_mode="r")
+        self.coef = np.load(os.path.join(model_dir, "coef.npy"), mmap_mode="r")
+        self.intercept = np.load(os.path.join(model_dir, "intercept.npy"))
+        self.classes_ = np.array(meta["classes"])
+        self.token_re = re.compile(meta["token_pattern"])
+        self.lowercase = meta["lowercase"]
+        self.ngram_range = tuple(meta["ngram_range"])
+        self.stop_words = frozenset(meta["stop_words"])
+        self.norm = meta["norm"]
+
+    def _terms(self, text):
+        if self.lowercase:
+            text = text.lower()
+        tokens = [t for t in self.token_re.findall(text) if t not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        terms = []
+        for n in range(min_n, max_n + 1):
+            terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def decision_function(self, texts):
+        # 整批文档的词项一次查表，按 (文档, 特征) 聚合出稀疏的 TF-IDF 值后直接与系数相乘
+        # 比词表中最长的词还长的词项不可能命中；不先去掉的话转换为词表的定长字符串类型时会被截断，可能误中其他特征
+        n_docs = len(texts)
+        width = self.vocab.dtype.itemsize // np.dtype("U1").itemsize
+        doc_terms = [[t for t in self._terms(text) if len(t) <= width] for text in texts]
+        rows = np.repeat(np.arange(n_docs), [len(terms) for terms in doc_terms])
+        terms = np.array([t for terms in doc_terms for t in terms], dtype=self.vocab.dtype)
+        scores = np.tile(self.intercept, (n_docs, 1))
+        if not terms.size:
+            return scores
+
+        pos = np.minimum(np.searchsorted(self.vocab, terms), len(self.vocab) - 1)
+        hit = self.vocab[pos] == terms
+        keys, counts = np.unique(rows[hit] * len(self.vocab) + pos[hit], return_counts=True)
+        rows, cols = np.divmod(keys, len(self.vocab))
+        values = counts * self.idf[cols]
+        if self.norm == "l2":
+            values /= np.sqrt(np.bincount(rows, values * values, minlength=n_docs))[rows]
+        elif self.norm == "l1":
+            values /= np.bincount(rows, np.abs(values), minlength=n_docs)[rows]
+        for k in range(scores.shape[1]):
+            scores[:, k] += np.bincount(rows, values * self.coef[k, cols], minlength=n_docs)
+        return scores
+
+    def predict(self, texts):
+        scores = self.decision_function(texts)
+        if scores.shape[1] == 1:
+            return self.classes_[(scores[:, 0] > 0).astype(int)]
+        return self.classes_[scores.argmax(axis=1)]
+
+    def predict_proba(self, texts):
+        scores = self.decision_function(texts)
+        if scores.shape[1] == 1:
+            pos = 1 / (1 + np.exp(-scores[:, 0]))
+            return np.column_stack([1 - pos, pos])
+        scores -= scores.max(axis=1, keepdims=True)
+        proba = np.exp(scores)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+
+def keyword_index_meta():
+    # 索引存在且生成时选择了用作关键词 IDF 时返回 meta.json 的内容，否则返回 None
+    meta_path = os.path.join(KEYWORD_INDEX_DIR, "meta.json")
+    if not USE_KEYWORD_INDEX or not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return meta if meta.get("keyword_idf") else None
+
+
+class KeywordIdf:
+    # 领域 IDF 表；词表与 IDF 保持内存映射，查询时在排序词表中二分查找，不把整张表读入字典，
+    # 未出现过的词使用 default_idf
+
+    def __init__(self, index_dir, meta):
+        self.terms = np.load(os.path.join(index_dir, "terms.npy"), mmap_mode="r")
+        self.idf = np.load(os.path.join(index_dir, "idf.npy"), mmap_mode="r")
+        self.default_idf = meta["default_idf"]
+        self.version = meta["version"]
+
+    def lookup(self, terms):
+        # 返回与 terms 一一对应的 IDF；查询词按自身长度比较，不会被截断成词表的定长字符串
+        if not terms or not len(self.terms):
+            return [self.default_idf] * len(terms)
+        keys = np.array(terms, dtype=str)
+        pos = np.minimum(np.searchsorted(self.terms, keys), len(self.terms) - 1)
+        found = self.terms[pos] == keys
+        return np.where(found, self.idf[pos], self.default_idf).tolist()
+
+
+def gazetteer_files(gazetteer_dir):
+    if not os.path.isdir(gazetteer_dir):
+        return []
+    return [os.path.join(gazetteer_dir, f) for f in sorted(os.listdir(gazetteer_dir)) if f.endswith(".txt")]
+
+
+class Gazetteer:
+    # 领域实体词典，所有词条预先建成字典树；扫描正文时每个位置沿字典树向后走，取最长的词条，
+    # 命中后从词条末尾继续，得到从左到右、互不重叠的最长匹配，每个位置最多比较最长词条长度个字符
+
+    def __init__(self, gazetteer_dir):
+        self.trie = {}
+        for path in gazetteer_files(gazetteer_dir):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    term = line.strip()
+                    if len(term) < 2 or term.startswith("#"):
+                        continue
+                    node = self.trie
+                    for ch in term:
+                        node = node.setdefault(ch, {})
+                    node[""] = term
+
+    def matches(self, text, start=0, end=None):
+        # 只在 [start, end) 内起始的词条才算命中，但词条可以越过 end 延伸到后文，
+        # 逐窗口匹配时跨越窗口边界的词条不会被切断
+        end = len(text) if end is None else end
+        n = len(text)
+        root = self.trie
+        hits = []
+        i = start
+        while i < end:
+            node = root.get(text[i])
+            if node is None:
+                i += 1
+                continue
+            found = None
+            j = i + 1
+            while True:
+                if "" in node:
+                    found = (i, j, node[""])
+                if j >= n:
+                    break
+                node = node.get(text[j])
+                if node is None:
+                    break
+                j += 1
+            if found:
+                hits.append(found)
+                i = found[1]
+            else:
+                i += 1
+        return hits
+
+    def matches_batch(self, texts):
+        # 以 BATCH_SEPARATOR 连接全部正文后只走一遍字典树，返回每篇正文各自的命中（位置相对于该篇）
+        starts = []
+        pos = 0
+        for text in texts:
+            starts.append(pos)
+            pos += len(text) + len(BATCH_SEPARATOR)
+        out = [[] for _ in texts]
+        for start, end, term in self.matches(BATCH_SEPARATOR.join(texts)):
+            k = bisect.bisect_right(starts, start) - 1
+            out[k].append((start - starts[k], end - starts[k], term))
+        return out
+
+
+def init_jieba():
+    if not jieba.dt.initialized:
+        start = time.perf_counter()
+        jieba.initialize()
+        load_metrics["jieba"] = time.perf_counter() - start
+        load_metrics["jieba_cache"] = jieba.dt.cache_file
+
+
+def load_classifier():
+    global classifier
+    with load_lock:
+        compact = USE_COMPACT_MODEL and os.path.exists(os.path.join(COMPACT_MODEL_DIR, "meta.json"))
+        available = compact or os.path.exists(MODEL_PATH)
+        if classifier is None and "classifier_error" not in load_metrics and available:
+            start = time.perf_counter()
+            try:
+                # 模型中的 numpy 数组直接内存映射，多个进程共享同一份页缓存
+                if compact:
+                    classifier = CompactClassifier(COMPACT_MODEL_DIR)
+                else:
+                    classifier = joblib.load(MODEL_PATH, mmap_mode="r")
+            except Exception as e:
+                load_metrics["classifier_error"] = f"{type(e).__name__}: {e}"
+                logger.warning("分类模型加载失败，将使用默认类标：%s", e)
+            info = online_snapshot() if classifier is not None else None
+            if info:
+                try:
+                    import online_learning
+                    classifier = online_learning.load_snapshot(classifier, info)
+                except Exception as e:
+                    resource_versions["model"] = base_model_version()
+                    logger.warning("增量模型加载失败，仅使用基础模型：%s", e)
+            load_metrics["classifier"] = time.perf_counter() - start
+    return classifier
+
+
+def set_classifier(clf, version):
+    # 原子替换当前分类模型；已经取得旧模型的批次继续用旧模型完成
+    global classifier
+    with load_lock:
+        classifier = clf
+        resource_versions["model"] = version
+
+
+def load_keyword_idf():
+    # 每个进程只检查一次索引目录，之后直接返回结果（可能为 None）
+    global keyword_idf, keyword_idf_checked
+    if keyword_idf_checked:
+        return keyword_idf
+    with load_lock:
+        if not keyword_idf_checked:
+            start = time.perf_counter()
+            try:
+                meta = keyword_index_meta()
+                if meta is not None:
+                    keyword_idf = KeywordIdf(KEYWORD_INDEX_DIR, meta)
+                    load_metrics["keyword_idf"] = time.perf_counter() - start
+            except Exception as e:
+                load_metrics["keyword_idf_error"] = f"{type(e).__name__}: {e}"
+                logger.warning("领域 IDF 表加载失败，使用 jieba 自带的 IDF：%s", e)
+        keyword_idf_checked = True
+    return keyword_idf
+
+
+def load_gazetteer():
+    # 与 load_keyword_idf 相同，每个进程只检查一次词典目录
+    global gazetteer, gazetteer_checked
+    if gazetteer_checked:
+        return gazetteer
+    with load_lock:
+        if not gazetteer_checked and USE_GAZETTEER and gazetteer_files(GAZETTEER_DIR):
+            start = time.perf_counter()
+            try:
+                gazetteer = Gazetteer(GAZETTEER_DIR)
+            except Exception as e:
+                load_metrics["gazetteer_error"] = f"{type(e).__name__}: {e}"
+                logger.warning("领域实体词典加载失败，只使用词性识别实体：%s", e)
+            load_metrics["gazetteer"] = time.perf_counter() - start
+        gazetteer_checked = True
+    return gazetteer
+
+
+def preload(background=False):
+    # 预先加载词典、停用词和分类模型，并跑一遍分析流程，避免首次分析时的冷启动延迟
+    if background:
+        thread = threading.Thread(target=preload, daemon=True)
+        thread.start()
+        return thread
+    start = time.perf_counter()
+    init_jieba()
+    load_stopwords()
+    load_classifier()
+    load_keyword_idf()
+    load_gazetteer()
+    warmup_start = time.perf_counter()
+    analyze_content("预热", "预热文本，用于加载分析流程中的各个模型。")
+    load_metrics["warmup"] = time.perf_counter() - warmup_start
+    load_metrics["preload"] = time.perf_counter() - start
+    return None
+
+
+def get_load_metrics():
+    return dict(load_metrics)
+
+
+def file_digest(path):
+    if not os.path.exists(path):
+        return "none"
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def base_model_version():
+    if "base_model" not in resource_versions:
+        meta_path = os.path.join(COMPACT_MODEL_DIR, "meta.json")
+        if USE_COMPACT_MODEL and os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                resource_versions["base_model"] = json.load(f)["source_digest"]
+        else:
+            resource_versions["base_model"] = file_digest(MODEL_PATH)
+    return resource_versions["base_model"]
+
+
+def online_snapshot():
+    # 当前增量模型快照的信息；没有快照或快照基于其他基础模型时返回 None
+    path = os.path.join(ONLINE_MODEL_DIR, "current.json")
+    if not USE_ONLINE_MODEL or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if info.get("base_version") != base_model_version() or not info.get("file"):
+        return None
+    return info
+
+
+def model_version():
+    if "model" not in resource_versions:
+        info = online_snapshot()
+        version = base_model_version()
+        if info:
+            version += f"+online{info['version']}"
+        resource_versions["model"] = version
+    return resource_versions["model"]
+
+
+def keyword_idf_version():
+    if "keyword_idf" not in resource_versions:
+        meta = keyword_index_meta()
+        resource_versions["keyword_idf"] = meta["version"] if meta else "jieba"
+    return resource_versions["keyword_idf"]
+
+
+def gazetteer_version():
+    if "gazetteer" not in resource_versions:
+        files = gazetteer_files(GAZETTEER_DIR) if USE_GAZETTEER else []
+        version = "none"
+        if files:
+            version = hashlib.sha1("".join(file_digest(path) for path in files).encode("ascii")).hexdigest()
+        resource_versions["gazetteer"] = version
+    return resource_versions["gazetteer"]
+
+
+def stopwords_version():
+    if "stopwords" not in resource_versions:
+        content = "\n".join(sorted(load_stopwords())).encode("utf-8")
+        resource_versions["stopwords"] = hashlib.sha1(content).hexdigest()
+    return resource_versions["stopwords"]
+
+
+# pseg.cut 内部对未登录词片段做 HMM 词性切分的私有方法（jieba 0.42.1，requirements.txt 中固定了版本）；
+# 升级后该方法不存在时退回公开的 pseg.dt.cut，仍可分析，但个别未登录词的切分可能与 pseg.cut 不同
+_pos_cut_detail = getattr(pseg.POSTokenizer, "_POSTokenizer__cut_detail", None)
+if _pos_cut_detail is None:
+    logger.warning("jieba %s 中没有 POSTokenizer.__cut_detail，未登录词的词性切分改用 pseg.cut", jieba.__version__)
+
+
+@lru_cache(maxsize=8192)
+def _cut_unknown(buf):
+    # 未登录词片段的 HMM 切分开销最大，且同一文档内常重复出现
+    words = tuple(finalseg.cut(buf))
+    if _pos_cut_detail is not None:
+        cut = _pos_cut_detail(pseg.dt, buf)
+    else:
+        cut = pseg.dt.cut(buf)
+    pairs = tuple((p.word, p.flag) for p in cut)
+    return words, pairs
+
+
+def segment(text):
+    # 一次 DAG 切分同时产出 jieba.lcut 与 pseg.cut 的结果，二者只在未登录词的 HMM 处理上不同
+    tokenizer = jieba.dt
+    postokenizer = pseg.dt
+    postokenizer.makesure_userdict_loaded()
+    word_tag = postokenizer.word_tag_tab
+    words = []
+    pairs = []
+
+    def flush(buf):
+        if len(buf) == 1:
+            words.append(buf)
+            pairs.append((buf, word_tag.get(buf, 'x')))
+        elif not tokenizer.FREQ.get(buf):
+            buf_words, buf_pairs = _cut_unknown(buf)
+            words.extend(buf_words)
+            pairs.extend(buf_pairs)
+        else:
+            for elem in buf:
+                words.append(elem)
+                pairs.append((elem, word_tag.get(elem, 'x')))
+
+    for blk in jieba.re_han_default.split(text):
+        if not blk:
+            continue
+        if not jieba.re_han_default.match(blk):
+            for x in jieba.re_skip_default.split(blk):
+                if jieba.re_skip_default.match(x):
+                    words.append(x)
+                    pairs.append((x, 'x'))
+                else:
+                    for xx in x:
+                        words.append(xx)
+                        pairs.append((xx, 'x'))
+            continue
+        if '%' in blk or '-' in blk:
+            # 两种分词器对 '%'、'-' 的分块规则不同，此类块各自切分
+            words.extend(tokenizer.cut(blk))
+            pairs.extend((p.word, p.flag) for p in postokenizer.cut(blk))
+            continue
+
+        DAG = tokenizer.get_DAG(blk)
+        route = {}
+        tokenizer.calc(blk, DAG, route)
+        x = 0
+        buf = ''
+        N = len(blk)
+        while x < N:
+            y = route[x][1] + 1
+            l_word = blk[x:y]
+            if y - x == 1:
+                buf += l_word
+            else:
+                if buf:
+                    flush(buf)
+                    buf = ''
+                words.append(l_word)
+                pairs.append((l_word, word_tag.get(l_word, 'x')))
+            x = y
+        if buf:
+            flush(buf)
+
+    return words, pairs
+
+
+class Instrumentation:
+    # 分析流程的计时/计数钩子，默认实现什么也不做
+    # 阶段：segment（分词与词性标注）、keywords、hf_words、entities、abstract、classify（整批）
 
-    clean_title = re.sub(r'[？?？\s]', '', title)
-    clean_doc = re.sub(r'[\r\n\t]+', ' ', document)
-    clean_doc = re.sub(r'\s+', ' ', clean_doc).strip()
+    def document(self, title, document):
+        return NULL_CONTEXT
 
-    sentences = re.split(r'([。！？?！])', clean_doc)
-    parts = []
-    for i in range(0, len(sentences) - 1, 2):
-        s = sentences[i].strip() + sentences[i + 1]
-        if len(s) > 8: parts.append(s)
+    def stage(self, name):
+        return NULL_CONTEXT
 
-    if not parts: return clean_doc[:max_len]
+    def count(self, name, value):
+        pass
 
-    title_keywords = [w for w in jieba.lcut(clean_title) if len(w) > 1]
-    answer_indicators = {'是', '因为', '由于', '建议', '方法', '做法', '原因', '通过', '可以', '导致'}
-    noise_words = {'来源', '点击', '下载', '作者', '卖家', '转载'}
 
+NULL_CONTEXT = nullcontext()
+instrumentation = Instrumentation()
+
+
+def set_instrumentation(instr):
+    global instrumentation
+    previous = instrumentation
+    instrumentation = instr or Instrumentation()
+    return previous
+
+
+def set_memory_budget(nbytes):
+    global ANALYSIS_MEMORY_BUDGET
+    ANALYSIS_MEMORY_BUDGET = int(nbytes)
+
+
+def stream_window_chars():
+    return max(MIN_STREAM_WINDOW, ANALYSIS_MEMORY_BUDGET // STREAM_BYTES_PER_CHAR)
+
+
+def iter_windows(text, size):
+    start = 0
+    n = len(text)
+    while n - start > size:
+        m = WINDOW_BREAK_RE.search(text, start + size, start + 2 * size)
+        # 超过一个窗口仍没有可切分的字符时只能硬切，切口处的分词可能与整篇分词不同
+        end = m.end() if m else start + size
+        yield text[start:end]
+        start = end
+    if start < n:
+        yield text[start:]
+
+
+def title_keywords_of(title):
+    clean_title = TITLE_STRIP_RE.sub('', title)
+    return [w for w in segment(clean_title)[0] if len(w) > 1]
+
+
+class AnalyzedDocument:
+    def __init__(self, title, document, stopwords):
+        self.title = title
+        self.document = document
+        _, title_pairs = segment(title)
+        doc_words, self.doc_pairs = segment(document)
+        self.token_count = len(doc_words)
+        self.keyword_pairs = title_pairs + self.doc_pairs
+        self.words = [w for w in doc_words if len(w) > 1 and w not in stopwords]
+        self.content_words = len(self.words)
+        self.stopwords = stopwords
+        self.title_keywords = title_keywords_of(title)
+
+    def keywords(self, topK=10):
+        return keywords_from_pairs(self.keyword_pairs, topK)
+
+    def word_counts(self):
+        return Counter(self.words)
+
+    def entities(self):
+        collector = EntityCollector(self.document, self.stopwords)
+        collector.feed(self.doc_pairs)
+        return collector.result()
+
+    def classifier_input(self):
+        return " ".join(self.words[:200])
+
+
+class StreamingDocument:
+    # 与 AnalyzedDocument 结果相同，但正文逐窗口分词后只保留词频、关键词词频、实体候选
+    # 以及分类器用到的前 200 个词，内存占用取决于窗口大小和词表大小，与正文长度无关
+    def __init__(self, title, document, stopwords, window=None):
+        self.title = title
+        self.document = document
+        _, title_pairs = segment(title)
+        self.keyword_freq = keyword_counts(title_pairs)
+        self.counts = Counter()
+        self.entity_collector = EntityCollector(document, stopwords)
+        self.words = []
+        self.token_count = 0
+        self.content_words = 0
+        for chunk in iter_windows(document, window or stream_window_chars()):
+            chunk_words, chunk_pairs = segment(chunk)
+            self.token_count += len(chunk_words)
+            words = [w for w in chunk_words if len(w) > 1 and w not in stopwords]
+            self.content_words += len(words)
+            self.counts.update(words)
+            if len(self.words) < 200:
+                self.words.extend(words[:200 - len(self.words)])
+            keyword_counts(chunk_pairs, self.keyword_freq)
+            if not self.entity_collector.done:
+                self.entity_collector.feed(chunk_pairs)
+        self.title_keywords = title_keywords_of(title)
+
+    def keywords(self, topK=10):
+        return top_keywords(self.keyword_freq, topK)
+
+    def word_counts(self):
+        return self.counts
+
+    def entities(self):
+        return self.entity_collector.result()
+
+    def classifier_input(self):
+        return " ".join(self.words)
+
+
+def analyzed_document(title, document, stopwords):
+    # 正文超过一个窗口时流式分析
+    if len(document) > stream_window_chars():
+        return StreamingDocument(title, document, stopwords)
+    return AnalyzedDocument(title, document, stopwords)
+
+
+def score_sentence(s, title_keywords, idx, start=0, end=None):
+    # 对 s[start:end] 打分，直接在原文上查找，不必复制出句子
+    end = len(s) if end is None else end
+    score = sum(1 for kw in title_keywords if s.find(kw, start, end) >= 0) * 3.5
+    if ANSWER_INDICATOR_RE.search(s, start, end): score += 4
+    score += max(0, 5 - idx * 0.5)
+    if NOISE_WORD_RE.search(s, start, end): score -= 10
+    return score
+
+
+def normalized_prefix(text, start, end, limit):
+    # text[start:end] 规整空白并去掉首尾空白后的前 limit 个字符，只复制必要长度的前缀
+    size = limit * 2 + 16
+    while True:
+        stop = min(end, start + size)
+        s = WHITESPACE_RE.sub(' ', text[start:stop]).lstrip()
+        if stop == end:
+            return s.rstrip()[:limit]
+        if len(s.rstrip()) >= limit:
+            return s[:limit]
+        size *= 4
+
+
+def sentence_at(document, pos, start_limit):
+    # pos 所在句子（不含末尾无句末标点的残句），返回 (句首位置, 句末标点, 句末位置) 或 None
+    end = SENTENCE_END_RE.search(document, pos)
+    if end is None:
+        return None
+    prev = LAST_SENTENCE_END_RE.match(document, start_limit, pos)
+    start = prev.end() if prev else start_limit
+    return start, end, end.end()
+
+
+def get_best_abstract(title, document, max_len=200, title_keywords=None):
+    if not document: return ""
+
+    if title_keywords is None:
+        clean_title = TITLE_STRIP_RE.sub('', title)
+        title_keywords = [w for w in jieba.lcut(clean_title) if len(w) > 1]
+
+    # 候选句只保存规整空白后的前 keep 个字符（打分仍针对整句），超长句子不会占用大量内存，
+    # 摘要最终只取前 max_len 个字符，结果不受影响
+    keep = max(max_len, 40) + 1
+
+    # 前 ABSTRACT_HEAD_SENTENCES 句逐句打分（含位置加分）；空白只在句内规整，结果与整篇规整后再分句相同
+    # scored_parts 中每项为 (句子, 得分, 句首位置)，同分时前面的句子优先
     scored_parts = []
-    for idx, s in enumerate(parts[:15]):
-        score = 0
-        match_count = sum(1 for kw in title_keywords if kw in s)
-        score += match_count * 3.5
-        if any(ind in s for ind in answer_indicators): score += 4
-        score += max(0, 5 - idx * 0.5)
-        if any(noise in s for noise in noise_words): score -= 10
-        scored_parts.append((s, score, idx))
-
-    top_candidates = sorted(scored_parts, key=lambda x: x[1], reverse=True)[:3]
+    rest = 0
+    for m in SENTENCE_END_RE.finditer(document):
+        start, rest = rest, m.end()
+        s = normalized_prefix(document, start, m.start(), keep) + m.group()
+        if len(s) > 8:
+            scored_parts.append((s, score_sentence(document, title_keywords, len(scored_parts), start, rest), start))
+            if len(scored_parts) >= ABSTRACT_HEAD_SENTENCES:
+                break
+
+    if not scored_parts:
+        return normalized_prefix(document, 0, len(document), max_len)
+    first_part = scored_parts[0][0]
+
+    # 其余句子已没有位置加分，不含任何关键词的句子得分不超过 0；只有含题目关键词（或在前面得分都很低时含回答提示词）
+    # 的句子才可能得正分，用一个预编译的多模式正则在剩余正文中直接定位这些句子，其他句子不必切分与打分
+    # 得分不超过当前第三名的句子不会入选，前三名已达到可能的最高分时提前结束
+    top_scores = sorted(p[1] for p in scored_parts)[-3:]
+    threshold = top_scores[0] if len(top_scores) == 3 else float("-inf")
+    best_possible = len(title_keywords) * 3.5 + 4
+    terms = list(title_keywords)
+    if threshold < 4:
+        terms.extend(ANSWER_INDICATORS)
+    if terms and threshold < best_possible:
+        candidate_re = re.compile("|".join(re.escape(t) for t in sorted(set(terms), key=len, reverse=True)))
+        pos = rest
+        for _ in range(ABSTRACT_MAX_EXTRA_SENTENCES):
+            m = candidate_re.search(document, pos)
+            if m is None:
+                break
+            found = sentence_at(document, m.start(), pos)
+            if found is None:
+                break
+            start, end, pos = found
+            s = normalized_prefix(document, start, end.start(), keep) + end.group()
+            if len(s) <= 8:
+                continue
+            score = score_sentence(document, title_keywords, ABSTRACT_HEAD_SENTENCES, start, pos)
+            if score <= threshold:
+                continue
+            scored_parts.append((s, score, start))
+            top_scores = sorted(top_scores + [score])[-3:]
+            if len(top_scores) == 3:
+                threshold = top_scores[0]
+                if threshold >= best_possible:
+                    break
+
+    # 得分不低于 0 的句子不足三句时，不含关键词的句子（0 分）也可能入选，按顺序补充打分，
+    # 直到某个位置之前已有三句得分不低于 0（其后的句子即使 0 分也排在它们之后）
+    nonnegative = sorted(p[2] for p in scored_parts if p[1] >= 0)
+    if len(nonnegative) < 3:
+        scored = {p[2] for p in scored_parts}
+        pos = rest
+        for _ in range(ABSTRACT_MAX_EXTRA_SENTENCES):
+            m = SENTENCE_END_RE.search(document, pos)
+            if m is None:
+                break
+            start, pos = pos, m.end()
+            if bisect.bisect_left(nonnegative, start) >= 3:
+                break
+            if start in scored:
+                continue
+            s = normalized_prefix(document, start, m.start(), keep) + m.group()
+            if len(s) <= 8:
+                continue
+            score = score_sentence(document, title_keywords, ABSTRACT_HEAD_SENTENCES, start, pos)
+            scored_parts.append((s, score, start))
+            if score >= 0:
+                bisect.insort(nonnegative, start)
+
+    top_candidates = sorted(scored_parts, key=lambda x: (-x[1], x[2]))[:3]
     top_candidates = sorted(top_candidates, key=lambda x: x[2])
 
     abstract = "".join([c[0] for c in top_candidates])
 
-    if len(abstract) < 40 and parts:
-        abstract = parts[0] + abstract
+    if len(abstract) < 40:
+        abstract = first_part + abstract
 
     if len(abstract) > max_len:
         last_punct = -1
@@ -92,16 +819,142 @@ def extract_keywords(text, stopwords):
         text,
         topK=10,
         withWeight=False,
-        allowPOS=('n', 'nr', 'ns', 'nt', 'nz', 'vn', 'v')
+        allowPOS=KEYWORD_POS
     )
     return tfidf_tags
 
 
+def keyword_terms(pairs):
+    # 可作为关键词的词：词性在 KEYWORD_POS 中、长度不小于 2 且不在 jieba 的关键词停用词中
+    stop_words = jieba.analyse.default_tfidf.stop_words
+    for w, flag in pairs:
+        if flag in KEYWORD_POS and len(w.strip()) >= 2 and w.lower() not in stop_words:
+            yield w
+
+
+def keyword_counts(pairs, freq=None):
+    # 累加候选关键词的词频，流式分析时逐窗口累加到同一个 freq 中
+    freq = {} if freq is None else freq
+    for w in keyword_terms(pairs):
+        freq[w] = freq.get(w, 0.0) + 1.0
+    return freq
+
+
+def top_keywords(freq, topK=10):
+    # 未加载领域 IDF 表时与 jieba.analyse.extract_tags(allowPOS=KEYWORD_POS) 的计算保持一致
+    idf = load_keyword_idf()
+    if idf is None:
+        tfidf = jieba.analyse.default_tfidf
+        idf_values = [tfidf.idf_freq.get(k, tfidf.median_idf) for k in freq]
+    else:
+        idf_values = idf.lookup(list(freq))
+    total = sum(freq.values())
+    weights = {k: v * w / total for (k, v), w in zip(freq.items(), idf_values)}
+    return sorted(weights, key=weights.__getitem__, reverse=True)[:topK]
+
+
+def keywords_from_pairs(pairs, topK=10):
+    return top_keywords(keyword_counts(pairs), topK)
+
+
 def extract_entities(text, stopwords):
+    # 逐窗口分词，前 ENTITY_LIMIT 个实体确定后即停止，不必对整篇正文做词性标注
+    collector = EntityCollector(text, stopwords)
+    for chunk in iter_windows(text, ENTITY_WINDOW_CHARS):
+        collector.feed(segment(chunk)[1])
+        if collector.done:
+            break
+    return collector.result()
+
+
+def extract_entities_batch(texts, stopwords):
+    # 结果与逐篇调用 extract_entities 相同：领域词典对全部正文只走一遍字典树；各篇仍逐窗口分词、各自提前停止，
+    # 整批内完全相同的窗口（重复文档、模板化的开头等）只做一次词性标注，未登录词的切分缓存也在整批内共享
+    gazetteer = load_gazetteer()
+    all_hits = gazetteer.matches_batch(texts) if gazetteer else [None] * len(texts)
+    tagged = {}
+    results = []
+    for text, hits in zip(texts, all_hits):
+        collector = EntityCollector(text, stopwords, hits=hits)
+        for chunk in iter_windows(text, ENTITY_WINDOW_CHARS):
+            pairs = tagged.get(chunk)
+            if pairs is None:
+                pairs = tagged[chunk] = segment(chunk)[1]
+            collector.feed(pairs)
+            if collector.done:
+                break
+        results.append(collector.result())
+    return results
+
+
+class EntityCollector:
+    # 按在正文中的位置合并领域词典命中与词性实体（与词典命中重叠的词性实体让位给词典命中），
+    # 取前 limit 个不重复的实体；没有领域词典时结果与 entities_from_pairs 相同
+    # 按顺序分段 feed 正文的分词结果，done 为真时后面的正文已不会改变结果
+    # hits 为预先对整篇正文做好的词典匹配（extract_entities_batch 整批匹配），为 None 时随 feed 逐段匹配
+
+    def __init__(self, text, stopwords, limit=ENTITY_LIMIT, hits=None):
+        self.text = text
+        self.stopwords = stopwords
+        self.limit = limit
+        self.gazetteer = load_gazetteer()
+        self.hits = hits
+        self.hit_starts = [h[0] for h in hits] if hits is not None else None
+        self.offset = 0
+        # 词典已扫描到的位置，以及上一段末尾越过窗口边界、仍覆盖本段开头的命中
+        self.scanned = 0
+        self.carry = []
+        self.first = {}
+        self.pos_words = set()
+        self.done = False
+
+    def _add(self, pos, w):
+        if len(w) > 1 and w not in self.stopwords and pos < self.first.get(w, len(self.text)):
+            self.first[w] = pos
+
+    def _matches(self, start, end):
+        # 在 [start, end) 内起始的词典命中；整篇的最长匹配与逐段匹配（命中可越过段尾）结果相同
+        if self.hits is None:
+            return self.gazetteer.matches(self.text, start, end)
+        return self.hits[bisect.bisect_left(self.hit_starts, start):bisect.bisect_left(self.hit_starts, end)]
+
+    def feed(self, pairs):
+        # pairs 为紧接在已处理部分之后的一段正文的分词与词性标注结果
+        pos = self.offset
+        end = pos + sum(len(w) for w, _ in pairs)
+        hits = []
+        if self.gazetteer:
+            hits = self._matches(max(pos, self.scanned), end)
+            for start, _, w in hits:
+                self._add(start, w)
+            self.scanned = max(self.scanned, end, hits[-1][1] if hits else end)
+            hits = self.carry + hits
+            self.carry = [h for h in hits[-1:] if h[1] > end]
+        i = 0
+        for w, flag in pairs:
+            w_end = pos + len(w)
+            if flag in ENTITY_POS and w not in self.pos_words and len(w) > 1 and w not in self.stopwords:
+                while i < len(hits) and hits[i][1] <= pos:
+                    i += 1
+                if i == len(hits) or hits[i][0] >= w_end:
+                    self._add(pos, w)
+                    self.pos_words.add(w)
+                    # 已有 limit 个更早出现的不同词性实体，之后的词性实体不会入选
+                    if len(self.pos_words) >= self.limit:
+                        break
+            pos = w_end
+        self.offset = end
+        self.done = len(self.first) >= self.limit
+
+    def result(self):
+        return sorted(self.first, key=self.first.__getitem__)[:self.limit]
+
+
+def entities_from_pairs(pairs, stopwords):
     entities = []
     seen = set()
-    for w, p in pseg.cut(text):
-        if p in ('nr', 'ns', 'nt') and len(w) > 1 and w not in stopwords:
+    for w, p in pairs:
+        if p in ENTITY_POS and len(w) > 1 and w not in stopwords:
             if w not in seen:
                 entities.append(w)
                 seen.add(w)
@@ -109,41 +962,88 @@ def extract_entities(text, stopwords):
     return entities
 
 
-def analyze_content(title, document):
-    stopwords = load_stopwords()
-    full_text = title + " " + document
+DEFAULT_LABEL = "生活"
 
-    keywords = extract_keywords(full_text, stopwords)[:5]
 
-    words = [w for w in jieba.lcut(document) if len(w) > 1 and w not in stopwords]
-    freq = Counter(words)
-    hf_words = []
-    for w, _ in freq.most_common(20):
-        if w not in keywords:
-            hf_words.append(w)
-        if len(hf_words) >= 5: break
-
-    key_hf = f"{','.join(keywords)},|{','.join(hf_words)}"
-    entity_str = ",".join(extract_entities(document, stopwords)) or "无"
+def extract_fields(doc, stopwords):
+    instr = instrumentation
+    with instr.stage("keywords"):
+        keywords = doc.keywords()[:5]
 
-    abstract = get_best_abstract(title, document, 200)
+    with instr.stage("hf_words"):
+        freq = doc.word_counts()
+        hf_words = []
+        for w, _ in freq.most_common(20):
+            if w not in keywords:
+                hf_words.append(w)
+            if len(hf_words) >= 5: break
 
-    global classifier
-    label = "生活"
-    if classifier is None and os.path.exists(MODEL_PATH):
-        try:
-            classifier = joblib.load(MODEL_PATH)
-        except:
-            pass
+    key_hf = f"{','.join(keywords)},|{','.join(hf_words)}"
+    with instr.stage("entities"):
+        entity_str = ",".join(doc.entities()) or "无"
 
-    if classifier and words:
-        label = classifier.predict([" ".join(words[:200])])[0]
+    with instr.stage("abstract"):
+        abstract = get_best_abstract(doc.title, doc.document, 200, doc.title_keywords)
 
     return {
-        "Title": title,
-        "ClassLabel": label,
+        "Title": doc.title,
+        "ClassLabel": DEFAULT_LABEL,
         "KeyWord_HFWord": key_hf,
         "NamedEntity": entity_str,
         "Abstract": abstract,
-        "Document": document
-    }
\ No newline at end of file
+        "Document": doc.document
+    }
+
+
+def classify_batch(docs, with_proba=False):
+    return classify_inputs([doc.classifier_input() if doc.words else None for doc in docs], with_proba)
+
+
+def classify_inputs(texts, with_proba=False):
+    # 整批文档只做一次 TF-IDF 变换和一次预测；texts 中为 None 的文档使用默认类标
+    labels = [DEFAULT_LABEL] * len(texts)
+    probas = [None] * len(texts)
+    clf = load_classifier()
+    idx = [i for i, text in enumerate(texts) if text is not None]
+    if not clf or not idx:
+        return labels, probas
+
+    inputs = [texts[i] for i in idx]
+    if with_proba and hasattr(clf, "predict_proba"):
+        proba = clf.predict_proba(inputs)
+        classes = clf.classes_
+        for row, i in enumerate(idx):
+            labels[i] = classes[proba[row].argmax()]
+            probas[i] = {str(c): float(p) for c, p in zip(classes, proba[row])}
+    else:
+        for i, label in zip(idx, clf.predict(inputs)):
+            labels[i] = label
+    return labels, probas
+
+
+def analyze_batch(items, with_proba=False):
+    stopwords = load_stopwords()
+    instr = instrumentation
+    # 整批只保留各文档的分类器输入，分词结果在抽取完字段后即可释放
+    inputs = []
+    results = []
+    for title, document in items:
+        with instr.document(title, document):
+            with instr.stage("segment"):
+                doc = analyzed_document(title, document, stopwords)
+            instr.count("tokens", doc.token_count)
+            instr.count("content_words", doc.content_words)
+            results.append(extract_fields(doc, stopwords))
+        inputs.append(doc.classifier_input() if doc.words else None)
+        del doc
+    with instr.stage("classify"):
+        labels, probas = classify_inputs(inputs, with_proba)
+    for res, label, proba in zip(results, labels, probas):
+        res["ClassLabel"] = label
+        if with_proba:
+            res["ClassProba"] = proba
+    return results
+
+
+def analyze_content(title, document):
+    return analyze_batch([(title, document)])[0]
@@ -0,0 +1,249 @@
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import threading
+
+import jieba
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+import nlp_core
+from batch_engine import result_log_path
+
+CURRENT_FILE = "current.json"
+HASH_FEATURES = 1 << 18
+# 每批修正样本重复学习的轮数，使单条修正即可改变同类文档的分类
+EPOCHS_PER_UPDATE = 5
+KEEP_SNAPSHOTS = 20
+DEFAULT_WATCH_INTERVAL = 2.0
+
+
+def new_model():
+    # 不带截距：校正模型只作用于修正样本中出现过的词项，不会整体偏向某个类别
+    return SGDClassifier(loss="log_loss", alpha=1e-4, fit_intercept=False, random_state=0)
+
+
+class OnlineClassifier:
+    # 基础模型的分数加上由人工修正增量训练的校正模型的分数
+    # 每次更新都生成新对象，旧对象保持不变，便于整体替换和回滚
+
+    vectorizer = HashingVectorizer(n_features=HASH_FEATURES, ngram_range=(1, 2), alternate_sign=False)
+
+    def __init__(self, base, model=None, version=0, samples=0):
+        self.base = base
+        self.model = model
+        self.version = version
+        self.samples = samples
+        self.classes_ = base.classes_
+
+    def decision_function(self, texts):
+        scores = np.array(self.base.decision_function(texts), dtype=np.float64)
+        if self.model is not None:
+            scores += self.model.decision_function(self.vectorizer.transform(texts))
+        return scores
+
+    def predict(self, texts):
+        return self.classes_[self.decision_function(texts).argmax(axis=1)]
+
+    def predict_proba(self, texts):
+        scores = self.decision_function(texts)
+        scores -= scores.max(axis=1, keepdims=True)
+        proba = np.exp(scores)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def updated(self, texts, labels, version=None):
+        model = copy.deepcopy(self.model) if self.model is not None else new_model()
+        features = self.vectorizer.transform(texts)
+        for _ in range(EPOCHS_PER_UPDATE):
+            model.partial_fit(features, labels, classes=self.classes_)
+        version = version if version is not None else self.version + 1
+        return OnlineClassifier(self.base, model, version, self.samples + len(texts))
+
+
+def snapshot_name(version):
+    return f"online_{version:05d}.pkl"
+
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(base, info, model_dir=None):
+    model_dir = model_dir or nlp_core.ONLINE_MODEL_DIR
+    data = joblib.load(os.path.join(model_dir, info["file"]))
+    return OnlineClassifier(base, data["model"], data["version"], data["samples"])
+
+
+def save_snapshot(clf, offsets, model_dir=None):
+    # 先写快照文件，再原子替换 current.json，读取方不会看到写了一半的模型
+    model_dir = model_dir or nlp_core.ONLINE_MODEL_DIR
+    os.makedirs(model_dir, exist_ok=True)
+    name = snapshot_name(clf.version)
+    tmp_path = os.path.join(model_dir, name + ".tmp")
+    joblib.dump({"model": clf.model, "version": clf.version, "samples": clf.samples}, tmp_path)
+    os.replace(tmp_path, os.path.join(model_dir, name))
+    write_current(model_dir, clf.version, clf.samples, offsets)
+    prune_snapshots(model_dir, clf.version)
+
+
+def write_current(model_dir, version, samples, offsets):
+    write_json_atomic(os.path.join(model_dir, CURRENT_FILE), {
+        "version": version,
+        "file": snapshot_name(version),
+        "samples": samples,
+        "base_version": nlp_core.base_model_version(),
+        "offsets": offsets,
+        "timestamp": time.time(),
+    })
+
+
+def list_snapshots(model_dir=None):
+    model_dir = model_dir or nlp_core.ONLINE_MODEL_DIR
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(int(f[len("online_"):-len(".pkl")]) for f in os.listdir(model_dir)
+                  if f.startswith("online_") and f.endswith(".pkl"))
+
+
+def prune_snapshots(model_dir, current_version):
+    for version in list_snapshots(model_dir)[:-KEEP_SNAPSHOTS]:
+        if version != current_version:
+            os.remove(os.path.join(model_dir, snapshot_name(version)))
+
+
+def read_corrections(path, offset, classes):
+    # 从 offset 处读取新追加的人工修正（D_Mark 为 "M"）记录，返回 (分类输入, 类标, 新偏移)
+    texts = []
+    labels = []
+    if not os.path.exists(path):
+        return texts, labels, 0
+    if os.path.getsize(path) < offset:
+        # 日志被清空或替换，从头读取
+        offset = 0
+    known = {str(c) for c in classes}
+    stopwords = nlp_core.load_stopwords()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            offset += len(raw)
+            try:
+                data = json.loads(raw.decode("utf-8"))
+                if data.get("D_Mark", [""])[0] != "M":
+                    continue
+                label = data.get("ClassLabel", [""])[0]
+                title = data.get("Title", [""])[0]
+                document = data.get("Document", [""])[0]
+            except (ValueError, AttributeError, IndexError):
+                continue
+            if label not in known:
+                continue
+            doc = nlp_core.analyzed_document(title, document, stopwords)
+            if doc.words:
+                texts.append(doc.classifier_input())
+                labels.append(label)
+    return texts, labels, offset
+
+
+class CorrectionLearner:
+    # 读取结果日志中新的人工修正，增量训练后保存新版本快照并替换进程内的分类模型
+
+    def __init__(self, model_dir=None):
+        self.model_dir = model_dir or nlp_core.ONLINE_MODEL_DIR
+        self.lock = threading.Lock()
+        info = nlp_core.online_snapshot() or {}
+        self.offsets = dict(info.get("offsets", {}))
+
+    def current(self):
+        clf = nlp_core.load_classifier()
+        if clf is None or isinstance(clf, OnlineClassifier):
+            return clf
+        return OnlineClassifier(clf)
+
+    def update(self, log_path):
+        # 返回本次学习的修正条数
+        with self.lock:
+            clf = self.current()
+            if clf is None:
+                return 0
+            key = os.path.abspath(log_path)
+            texts, labels, offset = read_corrections(log_path, self.offsets.get(key, 0), clf.classes_)
+            self.offsets[key] = offset
+            if not texts:
+                return 0
+            # 回滚后继续学习时使用新的版本号，不覆盖已有快照
+            version = max(list_snapshots(self.model_dir) + [clf.version]) + 1
+            clf = clf.updated(texts, labels, version)
+            save_snapshot(clf, self.offsets, self.model_dir)
+            nlp_core.set_classifier(clf, f"{nlp_core.base_model_version()}+online{clf.version}")
+            return len(texts)
+
+    def use_version(self, version):
+        # 回滚或前进到指定版本的快照
+        with self.lock:
+            clf = self.current()
+            if clf is None:
+                raise RuntimeError("基础分类模型不可用")
+            info = {"file": snapshot_name(version)}
+            clf = load_snapshot(clf.base, info, self.model_dir)
+            write_current(self.model_dir, clf.version, clf.samples, self.offsets)
+            nlp_core.set_classifier(clf, f"{nlp_core.base_model_version()}+online{clf.version}")
+            return clf
+
+
+learner = None
+
+
+def get_learner():
+    global learner
+    if learner is None:
+        learner = CorrectionLearner()
+    return learner
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="根据人工修正结果增量更新分类模型")
+    parser.add_argument("directory", nargs="?", help="文档目录（读取其中 result/result_log.jsonl）")
+    parser.add_argument("--watch", type=float, nargs="?", const=DEFAULT_WATCH_INTERVAL, default=None,
+                        help="持续监视结果日志，按给定间隔（秒）学习新的修正")
+    parser.add_argument("--list", action="store_true", help="列出已保存的模型快照")
+    parser.add_argument("--use", type=int, default=None, help="切换到指定版本的快照")
+    args = parser.parse_args(argv)
+
+    jieba.setLogLevel(jieba.logging.WARNING)
+    if args.list:
+        info = nlp_core.online_snapshot() or {}
+        for version in list_snapshots():
+            print(f"{version}{'  (当前)' if version == info.get('version') else ''}")
+        return 0
+    if args.use is not None:
+        clf = get_learner().use_version(args.use)
+        print(f"已切换到增量模型版本 {clf.version}（累计修正样本 {clf.samples} 条）")
+        return 0
+    if not args.directory:
+        parser.error("需要指定文档目录")
+
+    log_path = result_log_path(args.directory)
+    while True:
+        count = get_learner().update(log_path)
+        if count:
+            clf = nlp_core.load_classifier()
+            print(f"学习了 {count} 条人工修正，当前增量模型版本 {clf.version}")
+        if args.watch is None:
+            if not count:
+                print("没有新的人工修正")
+            return 0
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
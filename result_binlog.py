@@ -0,0 +1,410 @@
+import os
+import sys
+import json
+import zlib
+import struct
+import hashlib
+import argparse
+import threading
+
+# 紧凑的二进制结果日志（.rlog），可替代 result_log.jsonl：
+#   文件头 MAGIC，之后每条记录为 1 字节类型 + 4 字节长度 + 内容
+#   'D'  原文：20 字节 sha1 + zlib 压缩的 UTF-8 正文，相同的原文只写一次
+#   'R'  结果：扁平的 JSON 对象（字段不再包一层列表），Document 字段为原文 sha1 的十六进制串
+# 旁边的 .idx 文件按写入顺序记录每条记录的 (类型, 偏移, 长度)。读取题目、类标、关键词、时间戳时
+# 只读 'R' 记录，不解压也不解析原文；.idx 缺失或落后于日志时从最后一个已知位置扫描补齐
+BINLOG_SUFFIX = ".rlog"
+PARQUET_SUFFIX = ".parquet"
+MAGIC = b"DARLOG1\n"
+FRAME = struct.Struct("<cI")
+INDEX_ENTRY = struct.Struct("<cQI")
+DOCUMENT = b"D"
+RESULT = b"R"
+# 与 batch_engine.result_line 的字段顺序一致，转换回 JSONL 时按此顺序输出
+FIELDS = ("TimeStamp", "D_Mark", "FileName", "Title", "KeyWord_HFWord", "ClassLabel", "NamedEntity", "Abstract",
+          "Document", "DuplicateOf")
+PARQUET_BATCH = 1000
+# 结果日志被截断后重写时，用已索引的最后一条记录开头的这么多字节识别出来（见 ResultStore、BinaryResultLog）
+FINGERPRINT_BYTES = 256
+
+
+def flat_record(record):
+    # JSONL 中每个字段都是单元素列表，二进制日志与 Parquet 中直接存值
+    return {k: v[0] if isinstance(v, list) and len(v) == 1 else v for k, v in record.items()}
+
+
+def wrapped_record(flat):
+    return {k: [v] for k, v in flat.items()}
+
+
+def document_key(document):
+    return hashlib.sha1(document.encode("utf-8")).digest()
+
+
+class BinaryResultLog:
+    # 读写 .rlog 文件；多个线程可同时 append()，记录不会交错
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.lock = threading.RLock()
+        self.entries = []
+        self.documents = {}
+        self.end = len(MAGIC)
+        # 已索引的最后一条记录的帧头与内容开头；generation 在日志被改写、索引重建时加一
+        self.tail = None
+        self.generation = 0
+        self.file = None
+        self.index_file = None
+        self.refresh()
+
+    def _reset(self):
+        self.entries = []
+        self.documents = {}
+        self.end = len(MAGIC)
+        self.tail = None
+        self.generation += 1
+
+    def _read_tail(self, f):
+        kind, offset, length = self.entries[-1]
+        f.seek(offset)
+        return f.read(FRAME.size + min(length, FINGERPRINT_BYTES))
+
+    def _add_entry(self, kind, offset, length, f):
+        self.entries.append((kind, offset, length))
+        if kind == DOCUMENT:
+            f.seek(offset + FRAME.size)
+            self.documents[f.read(20).hex()] = (offset, length)
+        self.end = offset + FRAME.size + length
+
+    def refresh(self):
+        # 先读 .idx 中新增的条目，再扫描 .idx 之后写入的记录；末尾写了一半的记录留待下次
+        # 本对象正在写入时内存中的索引就是最新的
+        with self.lock:
+            if self.file is not None:
+                return
+            if not os.path.exists(self.path):
+                self._reset()
+                return
+            size = os.path.getsize(self.path)
+            with open(self.path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"不是结果日志文件：{self.path}")
+                # 日志被截断，或截断后又追加超过原来的长度（续跑批量任务时）：重新建立索引
+                if size < self.end or (self.tail is not None and self._read_tail(f) != self.tail):
+                    self._reset()
+                if os.path.exists(self.index_path):
+                    with open(self.index_path, "rb") as idx:
+                        idx.seek(len(self.entries) * INDEX_ENTRY.size)
+                        while True:
+                            raw = idx.read(INDEX_ENTRY.size)
+                            if len(raw) < INDEX_ENTRY.size:
+                                break
+                            kind, offset, length = INDEX_ENTRY.unpack(raw)
+                            if offset != self.end or offset + FRAME.size + length > size:
+                                break
+                            self._add_entry(kind, offset, length, f)
+                offset = self.end
+                while offset + FRAME.size <= size:
+                    f.seek(offset)
+                    kind, length = FRAME.unpack(f.read(FRAME.size))
+                    if kind not in (DOCUMENT, RESULT) or offset + FRAME.size + length > size:
+                        break
+                    self._add_entry(kind, offset, length, f)
+                    offset = self.end
+                if self.entries:
+                    self.tail = self._read_tail(f)
+
+    def _open_for_append(self):
+        if self.file is not None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as f:
+                f.write(MAGIC)
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+        self.refresh()
+        self.file = open(self.path, "r+b")
+        # 丢弃上次中断时写了一半的记录，并让 .idx 与日志一致
+        self.file.truncate(self.end)
+        self.file.seek(self.end)
+        self.index_file = open(self.index_path, "ab")
+        self.index_file.truncate(0)
+        self.index_file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in self.entries))
+
+    def _write_frame(self, kind, payload):
+        offset = self.end
+        self.file.write(FRAME.pack(kind, len(payload)))
+        self.file.write(payload)
+        self.index_file.write(INDEX_ENTRY.pack(kind, offset, len(payload)))
+        self.entries.append((kind, offset, len(payload)))
+        self.end = offset + FRAME.size + len(payload)
+        self.tail = FRAME.pack(kind, len(payload)) + payload[:FINGERPRINT_BYTES]
+        return offset
+
+    def append(self, record):
+        # record 可以是 JSONL 形式（字段包在列表中）或扁平形式
+        flat = flat_record(record)
+        with self.lock:
+            self._open_for_append()
+            document = flat.get("Document")
+            if document:
+                key = document_key(document)
+                if key.hex() not in self.documents:
+                    payload = key + zlib.compress(document.encode("utf-8"))
+                    self.documents[key.hex()] = (self._write_frame(DOCUMENT, payload), len(payload))
+                flat["Document"] = key.hex()
+            self._write_frame(RESULT, json.dumps(flat, ensure_ascii=False).encode("utf-8"))
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+                self.index_file.flush()
+
+    def sync(self):
+        with self.lock:
+            if self.file is not None:
+                self.flush()
+                os.fsync(self.file.fileno())
+                os.fsync(self.index_file.fileno())
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.sync()
+                self.file.close()
+                self.index_file.close()
+                self.file = None
+                self.index_file = None
+
+    def _read(self, f, offset, length):
+        f.seek(offset + FRAME.size)
+        return f.read(length)
+
+    def document(self, ref, f=None):
+        # 按 sha1 取出原文；f 为已打开的日志文件，批量读取时避免反复打开
+        if not ref:
+            return ""
+        offset, length = self.documents[ref]
+        if f is None:
+            self.flush()
+            with open(self.path, "rb") as f:
+                return self.document(ref, f)
+        return zlib.decompress(self._read(f, offset, length)[20:]).decode("utf-8")
+
+    def iter_records(self, documents=False, start=0):
+        # 逐条返回扁平的结果记录（从第 start 条记录开始）；documents=False 时 Document 字段仍为 sha1
+        with self.lock:
+            self.refresh()
+            self.flush()
+            entries = [(o, n) for k, o, n in self.entries if k == RESULT][start:]
+        with open(self.path, "rb") as f:
+            for offset, length in entries:
+                flat = json.loads(self._read(f, offset, length).decode("utf-8"))
+                if documents and "Document" in flat:
+                    flat["Document"] = self.document(flat["Document"], f)
+                yield flat
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class BinaryResultSink:
+    # 与 result_writer.ResultSink 接口相同，结果写入二进制日志
+
+    def __init__(self, path):
+        self.log = BinaryResultLog(path)
+        self.path = path
+        self.records = 0
+
+    def write_record(self, record):
+        self.log.append(record)
+        self.records += 1
+
+    def flush(self):
+        self.log.flush()
+
+    def checkpoint(self):
+        self.log.sync()
+
+    def close(self):
+        self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class BinaryResultStore:
+    # 与 result_store.ResultStore 接口相同：(FileName, D_Mark) -> 最新记录，建立索引时只读 'R' 记录
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.log = None
+        self.generation = None
+        self.indexed = 0
+        self.latest_index = {}
+
+    def refresh(self):
+        with self.lock:
+            if self.log is None:
+                if not os.path.exists(self.path):
+                    return
+                self.log = BinaryResultLog(self.path)
+            self.log.refresh()
+            if self.generation != self.log.generation:
+                # 日志被改写过，之前索引的记录可能已不存在
+                self.generation = self.log.generation
+                self.indexed = 0
+                self.latest_index = {}
+            for flat in self.log.iter_records(start=self.indexed):
+                self.indexed += 1
+                try:
+                    timestamp = float(flat.get("TimeStamp", 0))
+                except (TypeError, ValueError):
+                    timestamp = 0
+                key = (flat.get("FileName", ""), flat.get("D_Mark", ""))
+                current = self.latest_index.get(key)
+                if timestamp > (current[0] if current else 0):
+                    self.latest_index[key] = (timestamp, flat)
+
+    def latest(self, file_name, d_mark):
+        with self.lock:
+            self.refresh()
+            entry = self.latest_index.get((file_name, d_mark))
+            if entry is None:
+                return None
+            flat = dict(entry[1])
+            if "Document" in flat:
+                flat["Document"] = self.log.document(flat["Document"])
+            return wrapped_record(flat)
+
+    def append(self, line):
+        with self.lock:
+            if self.log is None:
+                self.log = BinaryResultLog(self.path)
+            self.log.append(json.loads(line))
+            self.log.flush()
+            self.refresh()
+
+    def clear(self):
+        with self.lock:
+            self.close()
+            for path in (self.path, self.path + ".idx"):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.indexed = 0
+            self.latest_index = {}
+
+    def close(self):
+        with self.lock:
+            if self.log is not None:
+                self.log.close()
+                self.log = None
+
+
+def iter_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def write_jsonl(records, path):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for flat in records:
+            f.write(json.dumps(wrapped_record(flat), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet 格式需要安装 pyarrow（pip install pyarrow）")
+    return pyarrow, pyarrow.parquet
+
+
+def write_parquet(records, path):
+    # 每个字段一列，原文使用字典编码 + zstd 压缩；只读取类标、关键词等列时不会读取原文列
+    pa, pq = import_pyarrow()
+    schema = pa.schema([(name, pa.string()) for name in FIELDS])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd", use_dictionary=["Document"]) as writer:
+        batch = []
+        for flat in records:
+            batch.append({name: None if flat.get(name) is None else str(flat[name]) for name in FIELDS})
+            if len(batch) >= PARQUET_BATCH:
+                writer.write_table(pa.Table.from_pylist(batch, schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema))
+            count += len(batch)
+    return count
+
+
+def iter_parquet(path, columns=None):
+    _, pq = import_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(columns=columns):
+        for row in batch.to_pylist():
+            yield {k: v for k, v in row.items() if not (k == "DuplicateOf" and v is None)}
+
+
+def read_records(path, documents=True):
+    # 按扩展名读取任一格式的结果文件，返回扁平记录
+    if path.endswith(BINLOG_SUFFIX):
+        return BinaryResultLog(path).iter_records(documents)
+    if path.endswith(PARQUET_SUFFIX):
+        return iter_parquet(path, None if documents else [f for f in FIELDS if f != "Document"])
+    return (flat_record(record) for record in iter_jsonl(path))
+
+
+def convert(src, dst):
+    if os.path.abspath(src) == os.path.abspath(dst):
+        raise ValueError("输入与输出不能是同一个文件")
+    records = read_records(src)
+    if dst.endswith(BINLOG_SUFFIX):
+        for path in (dst, dst + ".idx"):
+            if os.path.exists(path):
+                os.remove(path)
+        count = 0
+        with BinaryResultLog(dst) as log:
+            for flat in records:
+                log.append(flat)
+                count += 1
+        return count
+    if dst.endswith(PARQUET_SUFFIX):
+        return write_parquet(records, dst)
+    return write_jsonl(records, dst)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在 JSONL、二进制结果日志（.rlog）与 Parquet 之间转换结果文件")
+    parser.add_argument("src", help="输入文件，按扩展名识别格式（.jsonl / .rlog / .parquet）")
+    parser.add_argument("dst", help="输出文件，按扩展名识别格式")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.src):
+        print(f"文件不存在：{args.src}")
+        return 1
+    count = convert(args.src, args.dst)
+    print(f"转换完成：{count} 条记录，{os.path.getsize(args.src)} -> {os.path.getsize(args.dst)} 字节")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+import os
+import json
+import sqlite3
+import threading
+
+from result_binlog import BINLOG_SUFFIX, FINGERPRINT_BYTES, BinaryResultStore
+
+# 结果日志超过该大小时索引改存 SQLite，重新打开目录时不必重新扫描整个日志
+SQLITE_INDEX_MIN_BYTES = 64 << 20
+
+
+def _record_key(data):
+    file_name = data.get("FileName", [""])[0]
+    d_mark = data.get("D_Mark", [""])[0]
+    try:
+        timestamp = float(data.get("TimeStamp", ["0"])[0])
+    except (TypeError, ValueError):
+        timestamp = 0
+    return file_name, d_mark, timestamp
+
+
+class ResultStore:
+    # result_log.jsonl 的索引：(FileName, D_Mark) -> 最新记录在文件中的字节偏移
+    # 日志文件仍是唯一的数据来源，索引只记录偏移，按需增量扫描新追加的行
+    # 续跑批量任务时日志会被截回检查点再追加，长度可能超过原来的索引位置；因此同时记下已索引的最后一行的开头，
+    # 这部分内容变了就说明日志被改写过，整个重新建立索引
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.indexed_offset = 0
+        self.fingerprint = None
+        self.latest_index = {}
+
+    def _get(self, file_name, d_mark):
+        return self.latest_index.get((file_name, d_mark))
+
+    def _put(self, file_name, d_mark, timestamp, offset):
+        self.latest_index[(file_name, d_mark)] = (timestamp, offset)
+
+    def _set_indexed_offset(self, offset):
+        self.indexed_offset = offset
+
+    def _reset(self):
+        self.latest_index = {}
+        self.indexed_offset = 0
+        self.fingerprint = None
+
+    def _prefix_intact(self):
+        if self.fingerprint is None:
+            return True
+        start, head = self.fingerprint
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read(len(head)) == head
+
+    def refresh(self):
+        with self.lock:
+            if not os.path.exists(self.path):
+                if self.indexed_offset:
+                    self._reset()
+                return
+            size = os.path.getsize(self.path)
+            if size < self.indexed_offset or not self._prefix_intact():
+                # 日志被清空、替换或截断后重写，重新建立索引
+                self._reset()
+            if size == self.indexed_offset:
+                return
+
+            offset = self.indexed_offset
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        # 其他线程/进程尚未写完的行，下次再索引
+                        break
+                    line_offset = offset
+                    offset += len(raw)
+                    self.fingerprint = (line_offset, raw[:FINGERPRINT_BYTES])
+                    line = raw.strip()
+                    if not line:
+                        continue
+                    try:
+                        file_name, d_mark, timestamp = _record_key(json.loads(line.decode("utf-8")))
+                    except (ValueError, AttributeError, IndexError):
+                        continue
+                    current = self._get(file_name, d_mark)
+                    if timestamp > (current[0] if current else 0):
+                        self._put(file_name, d_mark, timestamp, line_offset)
+            self._set_indexed_offset(offset)
+
+    def latest(self, file_name, d_mark):
+        with self.lock:
+            self.refresh()
+            entry = self._get(file_name, d_mark)
+            if entry is None:
+                return None
+            with open(self.path, "rb") as f:
+                f.seek(entry[1])
+                return json.loads(f.readline().decode("utf-8"))
+
+    def append(self, line):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.refresh()
+
+    def clear(self):
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._reset()
+
+    def close(self):
+        pass
+
+
+class SqliteResultStore(ResultStore):
+    # 索引（连同已索引位置与最后一行的开头）持久化到日志旁的 SQLite 文件，重启后只需扫描新追加的行，
+    # 查询不必把整个索引读入内存，适合很大的日志
+
+    def __init__(self, path, db_path=None):
+        super().__init__(path)
+        self.db_path = db_path or sqlite_index_path(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS latest ("
+                          "file_name TEXT, d_mark TEXT, ts REAL, offset INTEGER, "
+                          "PRIMARY KEY (file_name, d_mark))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        self.indexed_offset = meta.get("indexed_offset", 0)
+        if meta.get("fingerprint_head") is not None:
+            self.fingerprint = (meta["fingerprint_start"], meta["fingerprint_head"])
+
+    def _get(self, file_name, d_mark):
+        return self.conn.execute("SELECT ts, offset FROM latest WHERE file_name = ? AND d_mark = ?",
+                                 (file_name, d_mark)).fetchone()
+
+    def _put(self, file_name, d_mark, timestamp, offset):
+        self.conn.execute("INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?)",
+                          (file_name, d_mark, timestamp, offset))
+
+    def _set_indexed_offset(self, offset):
+        self.indexed_offset = offset
+        start, head = self.fingerprint or (None, None)
+        self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                              [("indexed_offset", offset), ("fingerprint_start", start), ("fingerprint_head", head)])
+        self.conn.commit()
+
+    def _reset(self):
+        self.fingerprint = None
+        self.conn.execute("DELETE FROM latest")
+        self._set_indexed_offset(0)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def sqlite_index_path(path):
+    return os.path.splitext(path)[0] + ".index.sqlite"
+
+
+def open_result_store(path, use_sqlite=None):
+    # use_sqlite 为 None 时按日志大小决定：超过 SQLITE_INDEX_MIN_BYTES 或已有持久化索引时使用 SQLite 索引
+    if path.endswith(BINLOG_SUFFIX):
+        store = BinaryResultStore(path)
+    else:
+        if use_sqlite is None:
+            use_sqlite = os.path.exists(sqlite_index_path(path)) or (
+                os.path.exists(path) and os.path.getsize(path) >= SQLITE_INDEX_MIN_BYTES)
+        store = SqliteResultStore(path) if use_sqlite else ResultStore(path)
+    store.refresh()
+    return store
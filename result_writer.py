@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import threading
+
+from result_binlog import BINLOG_SUFFIX, BinaryResultSink
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class ResultSink:
+    # 结果文件在整个批次中保持打开，序列化后的行先缓存在内存中，
+    # 达到大小或时间阈值时一次写出；只有 checkpoint() 才调用 fsync
+    # 多个线程可同时 write()，行与行之间不会交错
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+        self.buffer = []
+        self.buffered = 0
+        self.last_flush = time.monotonic()
+        self.records = 0
+
+    def write(self, line):
+        with self.lock:
+            self.buffer.append(line)
+            self.buffered += len(line)
+            self.records += 1
+            if self.buffered >= self.buffer_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def write_record(self, record):
+        self.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _flush(self):
+        if self.buffer:
+            self.file.write("".join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def checkpoint(self):
+        with self.lock:
+            self._flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self._flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_result_sink(path):
+    # 以 .rlog 结尾的路径写入紧凑的二进制结果日志，其余写 JSONL
+    if path.endswith(BINLOG_SUFFIX):
+        return BinaryResultSink(path)
+    return ResultSink(path)
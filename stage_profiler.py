@@ -0,0 +1,165 @@
+import time
+import bisect
+import pstats
+import cProfile
+import threading
+from array import array
+from contextlib import contextmanager
+
+from nlp_core import Instrumentation
+
+# 直方图桶的上界（毫秒），最后一个桶收纳更慢的样本
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+# 逐篇明细只保留前若干篇，汇总统计始终覆盖全部文档
+DEFAULT_MAX_DOCUMENTS = 10000
+
+
+class _StatsHolder:
+    # pstats.Stats 只接受带 create_stats()/stats 的对象，用它承载从工作进程传回的统计数据
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class StageRecorder(Instrumentation):
+    # 记录每篇文档各阶段耗时、词数与长度；profile_every > 0 时每隔 N 篇文档用 cProfile 采样一次
+    # 阶段耗时以 "stage:<名称>" 为键保存在 values 中，整批执行的阶段（classify）不属于任何一篇文档
+
+    def __init__(self, profile_every=0, max_documents=DEFAULT_MAX_DOCUMENTS):
+        self.profile_every = profile_every
+        self.max_documents = max_documents
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.documents = []
+        self.values = {}
+        self.seen = 0
+        self.profile_stats = None
+
+    def _add_value(self, name, value):
+        self.values.setdefault(name, array("d")).append(value)
+
+    @contextmanager
+    def document(self, title, document):
+        record = {"title_chars": len(title), "doc_chars": len(document), "stages": {}}
+        with self.lock:
+            self.seen += 1
+            sampled = self.profile_every and (self.seen - 1) % self.profile_every == 0
+        profiler = cProfile.Profile() if sampled else None
+        self.local.current = record
+        if profiler:
+            try:
+                profiler.enable()
+            except ValueError:
+                # 其他线程的 profiler 正在运行，本篇不采样
+                profiler = None
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+                self._add_profile(profiler)
+            self.local.current = None
+            with self.lock:
+                if len(self.documents) < self.max_documents:
+                    self.documents.append(record)
+                for name, elapsed in record["stages"].items():
+                    self._add_value("stage:" + name, elapsed)
+                for name in ("doc_chars", "tokens", "content_words"):
+                    if name in record:
+                        self._add_value(name, record[name])
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            current = getattr(self.local, "current", None)
+            if current is not None:
+                current["stages"][name] = current["stages"].get(name, 0.0) + elapsed
+            else:
+                with self.lock:
+                    self._add_value("stage:" + name, elapsed)
+
+    def count(self, name, value):
+        current = getattr(self.local, "current", None)
+        if current is not None:
+            current[name] = value
+
+    def _add_profile(self, profiler):
+        profiler.create_stats()
+        with self.lock:
+            self._merge_profile(profiler.stats)
+
+    def _merge_profile(self, stats):
+        if self.profile_stats is None:
+            self.profile_stats = pstats.Stats(_StatsHolder(stats))
+        else:
+            self.profile_stats.add(_StatsHolder(stats))
+
+    def drain(self):
+        # 取出并清空已记录的数据，供工作进程传回主进程
+        with self.lock:
+            data = {
+                "documents": self.documents,
+                "values": self.values,
+                "profile": self.profile_stats.stats if self.profile_stats else None,
+            }
+            self.documents = []
+            self.values = {}
+            self.profile_stats = None
+        return data
+
+    def merge(self, data):
+        with self.lock:
+            self.documents.extend(data["documents"][:max(0, self.max_documents - len(self.documents))])
+            for name, values in data["values"].items():
+                self.values.setdefault(name, array("d")).extend(values)
+            if data["profile"]:
+                self._merge_profile(data["profile"])
+
+    def summary(self):
+        with self.lock:
+            values = {name: list(v) for name, v in self.values.items()}
+        return {
+            "documents": len(values.get("doc_chars", [])),
+            "stages": {name[len("stage:"):]: distribution(v, scale=1000)
+                       for name, v in values.items() if name.startswith("stage:")},
+            "doc_chars": distribution(values.get("doc_chars", [])),
+            "tokens": distribution(values.get("tokens", [])),
+            "content_words": distribution(values.get("content_words", [])),
+        }
+
+    def dump_profile(self, path):
+        with self.lock:
+            if self.profile_stats is None:
+                return False
+            self.profile_stats.dump_stats(path)
+            return True
+
+
+def distribution(values, scale=1):
+    # scale=1000 时 values 为秒，统计结果以毫秒表示并附带直方图
+    if not values:
+        return {"count": 0}
+    ordered = sorted(v * scale for v in values)
+    n = len(ordered)
+    result = {
+        "count": n,
+        "total": sum(ordered),
+        "mean": sum(ordered) / n,
+        "p50": ordered[int(0.5 * (n - 1))],
+        "p99": ordered[int(0.99 * (n - 1))],
+        "max": ordered[-1],
+    }
+    if scale == 1000:
+        buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        for v in ordered:
+            buckets[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, v)] += 1
+        labels = [f"<={b}ms" for b in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        result["histogram"] = dict(zip(labels, buckets))
+    return result
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import jieba
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+jieba.setLogLevel(jieba.logging.WARNING)
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # nlp_core 按当前目录查找 model/、停用词表与语料（与直接运行程序时相同），测试期间以仓库根目录为当前目录
+    monkeypatch.chdir(ROOT)
+
+
+def read_health_corpus(limit=None):
+    with open(os.path.join(ROOT, "health_corpus.txt"), "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return lines[:limit]
+
+
+@pytest.fixture(scope="session")
+def health_lines():
+    return read_health_corpus(200)
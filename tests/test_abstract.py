@@ -0,0 +1,86 @@
+import random
+import re
+
+import jieba
+import pytest
+
+import benchmark
+import nlp_core
+
+NOISE = ["本文来源于某某网络平台。", "点击这里可以下载全文内容。", "作者是某某某记者编辑。", "转载请注明出处和作者信息。",
+         "今天天气晴朗适合出门散步。", "这是一段没有关键词的普通陈述。"]
+
+
+def reference_abstract(title, document, max_len=200):
+    # 原来的实现去掉前 15 句的限制：整篇规整空白后逐句切分、逐句打分
+    if not document: return ""
+    clean_title = re.sub(r'[？?\s]', '', title)
+    clean_doc = re.sub(r'\s+', ' ', document).strip()
+    sentences = re.split(r'([。！？?])', clean_doc)
+    parts = []
+    for i in range(0, len(sentences) - 1, 2):
+        s = sentences[i].strip() + sentences[i + 1]
+        if len(s) > 8: parts.append(s)
+    if not parts: return clean_doc[:max_len]
+
+    title_keywords = [w for w in jieba.lcut(clean_title) if len(w) > 1]
+    scored_parts = []
+    for idx, s in enumerate(parts):
+        score = sum(1 for kw in title_keywords if kw in s) * 3.5
+        if any(ind in s for ind in nlp_core.ANSWER_INDICATORS): score += 4
+        score += max(0, 5 - idx * 0.5)
+        if any(noise in s for noise in nlp_core.NOISE_WORDS): score -= 10
+        scored_parts.append((s, score, idx))
+
+    top_candidates = sorted(scored_parts, key=lambda x: x[1], reverse=True)[:3]
+    abstract = "".join(c[0] for c in sorted(top_candidates, key=lambda x: x[2]))
+    if len(abstract) < 40:
+        abstract = parts[0] + abstract
+    if len(abstract) > max_len:
+        last_punct = max(abstract.rfind(p, 0, max_len) for p in ['。', '！', '？', '!'])
+        abstract = abstract[:last_punct + 1] if last_punct != -1 else abstract[:max_len]
+    abstract = abstract.strip().rstrip('，,：:;；')
+    if abstract and not abstract.endswith(('。', '！', '？')):
+        abstract += "。"
+    return abstract
+
+
+def with_noise(documents, seed=1):
+    # 在句间随机插入不含关键词或含噪声词的句子，另构造前几名都是负分的文档
+    rng = random.Random(seed)
+    out = []
+    for title, document in documents:
+        sentences = [s + "。" for s in re.split("[。！？?]", document) if s]
+        mixed = []
+        for s in sentences:
+            mixed.append(s)
+            if rng.random() < 0.5:
+                mixed.append(rng.choice(NOISE))
+        out.append((title, "".join(mixed)))
+        out.append(("无关题目", "".join(rng.choice(NOISE[:4]) for _ in range(20))
+                    + "".join(rng.choice(NOISE[4:]) for _ in range(5))))
+    return out
+
+
+@pytest.mark.parametrize("kind", ["corpus", "synthetic"])
+@pytest.mark.parametrize("size", [200, 2000, 8000])
+def test_matches_full_document_scoring(kind, size):
+    documents = benchmark.make_inputs(kind, size, 10)
+    documents += with_noise(documents)
+    for title, document in documents:
+        assert nlp_core.get_best_abstract(title, document) == reference_abstract(title, document)
+
+
+def test_late_sentence_is_selected():
+    # 与题目相关的句子在第 15 句之后，原来只看前 15 句时选不到
+    title = "糖尿病饮食注意什么"
+    document = "".join(f"第{i}段内容与主题无关，仅作普通陈述。" for i in range(40))
+    document += "糖尿病患者饮食要控制总热量，少吃甜食。"
+    abstract = nlp_core.get_best_abstract(title, document)
+    assert "糖尿病患者饮食要控制总热量" in abstract
+    assert abstract == reference_abstract(title, document)
+
+
+@pytest.mark.parametrize("document", ["", "短句。", "没有句末标点的一段文字" * 30, "  空白\n\t较多的  句子，用来检查规整。" * 5])
+def test_edge_cases(document):
+    assert nlp_core.get_best_abstract("题目", document) == reference_abstract("题目", document)
@@ -0,0 +1,95 @@
+import pytest
+
+import nlp_core
+from analysis_cache import AnalysisCache
+
+TITLE = "高血压患者的饮食"
+DOCUMENT = "高血压患者应当少吃盐，多吃蔬菜水果，坚持适量运动，并按时服用降压药物。"
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    # 每个测试从空的版本表开始，相当于新启动的进程
+    monkeypatch.setattr(nlp_core, "resource_versions", {})
+    monkeypatch.setattr(nlp_core, "classifier", nlp_core.load_classifier())
+    return nlp_core.resource_versions
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    # 记录真正送去分析（未命中缓存）的文档标题
+    titles = []
+    analyze_batch = nlp_core.analyze_batch
+
+    def counting(items):
+        titles.extend(title for title, _ in items)
+        return analyze_batch(items)
+
+    monkeypatch.setattr(nlp_core, "analyze_batch", counting)
+    return titles
+
+
+def test_repeated_document_hits_cache(versions, computed):
+    cache = AnalysisCache()
+    first = cache.analyze(TITLE, DOCUMENT)
+    second = cache.analyze(TITLE, DOCUMENT)
+    assert computed == [TITLE]
+    assert second == {k: str(v) for k, v in first.items()}
+    assert cache.stats()["hits"] == 1
+
+
+def test_model_change_invalidates(versions, computed):
+    cache = AnalysisCache()
+    cache.analyze(TITLE, DOCUMENT)
+    # 增量学习发布新快照时通过 set_classifier 换模型，旧结果不能再用
+    nlp_core.set_classifier(nlp_core.classifier, nlp_core.model_version() + "+online1")
+    cache.analyze(TITLE, DOCUMENT)
+    assert computed == [TITLE, TITLE]
+    cache.analyze(TITLE, DOCUMENT)
+    assert computed == [TITLE, TITLE]
+
+
+def test_stopwords_change_invalidates_disk_cache(versions, computed, tmp_path, monkeypatch):
+    stopwords = tmp_path / "stopwords.txt"
+    stopwords.write_text("的\n了\n", encoding="utf-8")
+    monkeypatch.setattr(nlp_core, "STOPWORDS_PATH", str(stopwords))
+    monkeypatch.setattr(nlp_core, "stopwords_cache", None)
+    db = str(tmp_path / "cache" / "analysis.sqlite")
+
+    cache = AnalysisCache(disk_path=db)
+    cache.analyze(TITLE, DOCUMENT)
+    cache.close()
+    cache = AnalysisCache(disk_path=db)
+    cache.analyze(TITLE, DOCUMENT)
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+    # 停用词表修改后重新启动：磁盘上的旧结果不再命中
+    stopwords.write_text("的\n了\n患者\n", encoding="utf-8")
+    nlp_core.stopwords_cache = None
+    versions.clear()
+    cache = AnalysisCache(disk_path=db)
+    cache.analyze(TITLE, DOCUMENT)
+    assert cache.stats()["disk_hits"] == 0
+    assert computed == [TITLE, TITLE]
+    cache.close()
+
+
+def test_gazetteer_change_invalidates(versions, computed, tmp_path, monkeypatch):
+    terms = tmp_path / "terms.txt"
+    terms.write_text("降压药物\n", encoding="utf-8")
+    monkeypatch.setattr(nlp_core, "GAZETTEER_DIR", str(tmp_path))
+    monkeypatch.setattr(nlp_core, "USE_GAZETTEER", True)
+    monkeypatch.setattr(nlp_core, "gazetteer", None)
+    monkeypatch.setattr(nlp_core, "gazetteer_checked", False)
+
+    cache = AnalysisCache()
+    cache.analyze(TITLE, DOCUMENT)
+    before = nlp_core.gazetteer_version()
+    assert before != "none"
+
+    terms.write_text("降压药物\n蔬菜水果\n", encoding="utf-8")
+    versions.pop("gazetteer")
+    assert nlp_core.gazetteer_version() != before
+    cache.analyze(TITLE, DOCUMENT)
+    assert computed == [TITLE, TITLE]
@@ -0,0 +1,127 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import analysis_server
+import nlp_core
+
+DOC = {"Title": "高血压", "Document": "高血压患者要注意饮食，少吃盐，按时服药。"}
+
+
+class Server:
+    def __init__(self, httpd):
+        self.httpd = httpd
+        self.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+        self.batcher = httpd.RequestHandlerClass.batcher
+        # 标题为 SLOW 的文档开始分析时置位 entered，并等待 gate 才继续
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def request(self, path, data=None):
+        body = None if data is None else json.dumps(data, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(self.url + path, body, {"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=30) as r:
+                return r.status, json.load(r), r.headers
+        except urllib.error.HTTPError as e:
+            return e.code, json.load(e), e.headers
+
+    def metrics(self):
+        return self.request("/metrics")[1]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    analyze_batch = nlp_core.analyze_batch
+
+    def patched(items, with_proba=False):
+        titles = [title for title, _ in items]
+        if "BAD" in titles:
+            raise ValueError("无法分析")
+        if "SLOW" in titles:
+            srv.entered.set()
+            srv.gate.wait(30)
+        return analyze_batch(items, with_proba)
+
+    monkeypatch.setattr(nlp_core, "analyze_batch", patched)
+    httpd = analysis_server.create_server(port=0, max_batch=32, window_ms=200, queue_size=4)
+    srv = Server(httpd)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.gate.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def concurrently(*calls):
+    out = [None] * len(calls)
+
+    def run(i, call):
+        out[i] = call()
+
+    threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(calls)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out
+
+
+def test_analyze_and_batch(server):
+    expected = json.loads(json.dumps(nlp_core.analyze_content(DOC["Title"], DOC["Document"]), ensure_ascii=False))
+    status, result, _ = server.request("/analyze", DOC)
+    assert status == 200 and result == expected
+    status, data, _ = server.request("/batch", {"documents": [DOC, {"title": "空", "content": ""}]})
+    assert status == 200
+    assert data["results"][0] == expected and len(data["results"]) == 2
+    assert server.request("/batch", {"docs": []})[0] == 400
+    assert server.request("/unknown", {})[0] == 404
+
+
+def test_concurrent_requests_share_a_batch(server):
+    a, b = concurrently(lambda: server.request("/batch", {"documents": [DOC] * 2}),
+                        lambda: server.request("/analyze", dict(DOC, Title="饮食")))
+    assert a[0] == b[0] == 200
+    assert b[1]["Title"] == "饮食"
+    metrics = server.metrics()
+    assert metrics["batches"] == 1
+    assert metrics["documents"] == 3
+
+
+def test_document_error_fails_only_its_request(server):
+    good, bad = concurrently(lambda: server.request("/batch", {"documents": [DOC] * 2}),
+                             lambda: server.request("/batch", {"documents": [DOC, {"Title": "BAD", "Document": "x"}]}))
+    assert good[0] == 200 and len(good[1]["results"]) == 2
+    assert bad[0] == 500
+    assert bad[1]["index"] == 1 and "ValueError" in bad[1]["error"]
+    assert server.metrics()["errors"] == 1
+
+
+def test_full_queue_returns_503(server):
+    server.gate.clear()
+    slow = threading.Thread(target=server.request, args=("/analyze", dict(DOC, Title="SLOW")))
+    slow.start()
+    assert server.entered.wait(30)
+    # 处理线程被占住，再排入 3 篇后等待中的文档数为 3，再来 2 篇超过 queue_size
+    waiting = server.batcher.submit([(DOC["Title"], DOC["Document"])] * 3)
+    status, data, headers = server.request("/batch", {"documents": [DOC] * 2})
+    assert status == 503 and headers["Retry-After"] == "1"
+    assert server.metrics()["rejected"] == 1
+    assert server.metrics()["queue_depth"] == 3
+
+    server.gate.set()
+    slow.join()
+    assert len(waiting.result(30)) == 3
+    assert server.request("/batch", {"documents": [DOC] * 2})[0] == 200
+
+
+def test_large_request_accepted_when_idle(server):
+    # 超过 queue_size 的单个请求在队列为空时仍被处理
+    future = server.batcher.submit([(DOC["Title"], DOC["Document"])] * 9)
+    assert len(future.result(30)) == 9
+    assert server.batcher.pending == 0
@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import batch_engine
+from conftest import ROOT, read_health_corpus
+
+# 子进程在写出第 KILL_AT 条结果后直接 os._exit，不做任何清理，模拟进程被杀
+KILL_AT = 25
+CHILD = """
+import os, sys, jieba
+jieba.setLogLevel(jieba.logging.WARNING)
+import batch_engine
+directory, interval, kill_at = sys.argv[1], float(sys.argv[2]), int(sys.argv[3])
+
+def progress(done, record):
+    if done == kill_at:
+        os._exit(9)
+
+save_path = batch_engine.result_log_path(directory)
+job = batch_engine.BatchJob(directory, save_path, batch_engine.list_jsonl_files(directory), interval)
+batch_engine.run_batch(directory, workers=1, progress=progress, job=job)
+"""
+
+
+def write_inputs(directory, lines, n_files, per_file, prefix="part"):
+    names = []
+    for i in range(n_files):
+        name = f"{prefix}{i}.jsonl"
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            for line in lines[i * per_file:(i + 1) * per_file]:
+                f.write(json.dumps({"title": line[:12], "content": line}, ensure_ascii=False) + "\n")
+        names.append(name)
+    return names
+
+
+def result_names(save_path):
+    with open(save_path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["FileName"][0] for line in f]
+
+
+@pytest.mark.parametrize("interval", [0, 3600])
+def test_kill_and_resume_without_duplicates(tmp_path, interval):
+    directory = str(tmp_path)
+    lines = read_health_corpus(80)
+    write_inputs(directory, lines, 3, 20)
+    expected = {f"part{i}.jsonl" + (f"#{j}" if j > 1 else "") for i in range(3) for j in range(1, 21)}
+
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONWARNINGS="ignore")
+    proc = subprocess.run([sys.executable, "-c", CHILD, directory, str(interval), str(KILL_AT)], cwd=ROOT, env=env)
+    assert proc.returncode == 9
+
+    save_path = batch_engine.result_log_path(directory)
+    # 中断后新增的文件不影响识别未完成的任务，也不会混进续跑
+    write_inputs(directory, lines[60:], 1, 20, prefix="added")
+    state = batch_engine.unfinished_job(directory, save_path)
+    assert state is not None
+    assert state["total"] == (KILL_AT if interval == 0 else 0)
+
+    success, total = batch_engine.run_batch(directory, workers=1, resume=True)
+    names = result_names(save_path)
+    assert (success, total) == (60, 60)
+    assert len(names) == len(set(names))
+    assert set(names) == expected
+    assert batch_engine.unfinished_job(directory, save_path) is None
@@ -0,0 +1,30 @@
+import joblib
+import numpy as np
+
+import nlp_core
+
+
+def classifier_inputs(lines):
+    stopwords = nlp_core.load_stopwords()
+    return [nlp_core.AnalyzedDocument("", line, stopwords).classifier_input() for line in lines]
+
+
+def test_compact_matches_pipeline(health_lines):
+    pipeline = joblib.load(nlp_core.MODEL_PATH)
+    compact = nlp_core.CompactClassifier(nlp_core.COMPACT_MODEL_DIR)
+    texts = classifier_inputs(health_lines) + ["", "完全 没有 出现 在 词表 中 的 词语 abcdefg"]
+    assert list(compact.classes_) == list(pipeline.classes_)
+    np.testing.assert_allclose(compact.predict_proba(texts), pipeline.predict_proba(texts), rtol=0, atol=1e-9)
+    assert list(compact.predict(texts)) == list(pipeline.predict(texts))
+
+
+def test_compact_ignores_terms_longer_than_vocab():
+    # 比词表定长字符串更长的词项不能被截断后误中词表中的特征
+    pipeline = joblib.load(nlp_core.MODEL_PATH)
+    compact = nlp_core.CompactClassifier(nlp_core.COMPACT_MODEL_DIR)
+    width = compact.vocab.dtype.itemsize // np.dtype("U1").itemsize
+    term = next(str(t) for t in compact.vocab if len(t) == width)
+    # 截断到词表宽度后恰好等于 term
+    longer = term + "病"
+    texts = [longer, f"{term} {longer}"]
+    np.testing.assert_allclose(compact.predict_proba(texts), pipeline.predict_proba(texts), rtol=0, atol=1e-9)
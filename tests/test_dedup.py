@@ -0,0 +1,84 @@
+import nlp_core
+from conftest import read_health_corpus
+from dedup import Deduplicator
+from jsonl_reader import DocumentRecord
+
+
+def article(start, count=8):
+    lines = read_health_corpus(start + count)
+    return "。".join(lines[start:start + count]) + "。"
+
+
+def record(name, title, document):
+    return DocumentRecord(name, 1, title, document, 0, None)
+
+
+def test_exact_duplicate_ignores_whitespace():
+    dedup = Deduplicator()
+    assert dedup.find("a", "题目", "第一句。 第二句。") is None
+    assert dedup.find("b", " 题目", "第一句。\n\n第二句。\t") == "a"
+    assert dedup.stats()["exact_duplicates"] == 1
+
+
+def test_near_duplicate():
+    dedup = Deduplicator()
+    original = article(0)
+    assert dedup.find("a", "流感疫苗", original) is None
+    # 转载时改动个别字并加上来源说明，仍判为近似重复
+    reposted = original.replace("建议", "提倡", 1) + "（转自健康网）"
+    assert dedup.find("b", "流感疫苗", reposted) == "a"
+    assert dedup.find("c", "高血压", article(20)) is None
+    assert dedup.stats() == {"documents": 3, "exact_duplicates": 0, "near_duplicates": 1, "dedup_ratio": 1 / 3}
+
+
+def test_short_documents_only_exact():
+    dedup = Deduplicator()
+    assert dedup.find("a", "短文", "多喝水，多休息。") is None
+    assert dedup.find("b", "短文", "多喝水，多休息！") is None
+    assert not dedup.signatures
+
+
+def test_eviction_drops_least_recently_used():
+    dedup = Deduplicator(max_results=2)
+    docs = {name: article(i * 10) for i, name in enumerate("abc")}
+    assert dedup.find("a", "", docs["a"]) is None
+    assert dedup.find("b", "", docs["b"]) is None
+    # a 刚被用到，再登记 c 时淘汰的是 b
+    assert dedup.find("a2", "", docs["a"]) == "a"
+    assert dedup.find("c", "", docs["c"]) is None
+    assert list(dedup.canonicals) == ["a", "c"]
+    assert set(dedup.signatures) == {"a", "c"}
+    assert set(dedup.exact.values()) == {"a", "c"}
+    assert all(name in ("a", "c") for bucket in dedup.buckets for names in bucket.values() for name in names)
+    # b 被淘汰后，同样的内容重新成为代表文档
+    assert dedup.find("b2", "", docs["b"]) is None
+    assert list(dedup.canonicals) == ["c", "b2"]
+
+
+def test_annotate_and_resolve():
+    dedup = Deduplicator()
+    document = article(0)
+    records = [record("a", "流感", document), record("b", "流感疫苗", document),
+               record("c", "空", ""), record("d", "失败", document)._replace(error="读取失败")]
+    annotated = list(dedup.annotate(records, lambda r: r.source))
+    assert [r.duplicate_of for r in annotated] == [None, "a", None, None]
+
+    result = nlp_core.analyze_content("流感", document)
+    assert dedup.resolve(annotated[0], "a", result) == (result, None)
+    reused, canonical = dedup.resolve(annotated[1], "b", None)
+    assert canonical == "a"
+    assert reused == dict(result, Title="流感疫苗", Document=document)
+
+
+def test_resolve_after_canonical_evicted():
+    dedup = Deduplicator(max_results=1)
+    first, second = record("a", "流感", article(0)), record("b", "高血压", article(20))
+    duplicate = record("a2", "流感", article(0))
+    annotated = list(dedup.annotate([first, duplicate, second], lambda r: r.source))
+    dedup.resolve(annotated[0], "a", nlp_core.analyze_content(first.title, first.document))
+    dedup.resolve(annotated[2], "b", nlp_core.analyze_content(second.title, second.document))
+    # a 已被淘汰，重复文档单独分析
+    result, canonical = dedup.resolve(annotated[1], "a2", None)
+    assert canonical is None
+    assert result == nlp_core.analyze_content(duplicate.title, duplicate.document)
+    assert "a" not in dedup.results
@@ -0,0 +1,57 @@
+import pytest
+
+import nlp_core
+from conftest import read_health_corpus
+
+TERMS = ["高血压性心脏病", "二型糖尿病", "阿司匹林肠溶片", "心脏"]
+
+
+@pytest.fixture
+def gazetteer(tmp_path, monkeypatch):
+    (tmp_path / "drugs.txt").write_text("# 测试词典\n" + "\n".join(TERMS) + "\n", encoding="utf-8")
+    gazetteer = nlp_core.Gazetteer(str(tmp_path))
+    monkeypatch.setattr(nlp_core, "gazetteer", gazetteer)
+    monkeypatch.setattr(nlp_core, "gazetteer_checked", True)
+    return gazetteer
+
+
+def test_gazetteer_term_spanning_window_boundary(gazetteer, monkeypatch):
+    # 没有标点可切分时窗口硬切，"高血压性心脏病" 正好被切在两个窗口之间
+    text = "患者" + "高血压性心脏病" + "多年" * 10
+    monkeypatch.setattr(nlp_core, "ENTITY_WINDOW_CHARS", 5)
+    assert list(nlp_core.iter_windows(text, 5))[0] == "患者高血压"
+    entities = nlp_core.extract_entities(text, set())
+    assert entities[0] == "高血压性心脏病"
+    # 词条内部的 "心脏" 不应单独命中
+    assert "心脏" not in entities
+
+
+def test_windowed_matches_full_scan(gazetteer):
+    text = "".join(TERMS[i % 4] + "张三在北京" for i in range(20))
+    full = gazetteer.matches(text)
+    for size in (3, 7, 16):
+        collector = nlp_core.EntityCollector(text, set(), limit=100)
+        hits = []
+        collector._add = lambda pos, w: hits.append((pos, w))
+        for chunk in nlp_core.iter_windows(text, size):
+            collector.feed(nlp_core.segment(chunk)[1])
+        assert [h for h in hits if h[1] in TERMS] == [(s, w) for s, _, w in full]
+
+
+def test_matches_batch_does_not_cross_documents(gazetteer):
+    texts = ["服用阿司匹林", "肠溶片后", "高血压性心脏病", ""]
+    assert gazetteer.matches_batch(texts) == [[], [], [(0, 7, "高血压性心脏病")], []]
+
+
+@pytest.mark.parametrize("with_gazetteer", [False, True])
+def test_batch_matches_single(request, monkeypatch, with_gazetteer):
+    if with_gazetteer:
+        request.getfixturevalue("gazetteer")
+    else:
+        monkeypatch.setattr(nlp_core, "gazetteer", None)
+        monkeypatch.setattr(nlp_core, "gazetteer_checked", True)
+    lines = read_health_corpus(120)
+    texts = ["".join(lines[i:i + 12]) + TERMS[i % 4] for i in range(0, 120, 6)]
+    texts += texts[:5] + ["", "张三在北京大学", "二型糖尿病"]
+    stopwords = nlp_core.load_stopwords()
+    assert nlp_core.extract_entities_batch(texts, stopwords) == [nlp_core.extract_entities(t, stopwords) for t in texts]
@@ -0,0 +1,100 @@
+import gzip
+import json
+import os
+import time
+
+from conftest import read_health_corpus
+from batch_engine import result_log_path, watch_state_path
+from folder_watcher import FolderWatcher
+
+
+def append_records(path, lines):
+    with open(path, "a", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps({"title": line[:12], "content": line}, ensure_ascii=False) + "\n")
+
+
+def run_once(directory, skip_existing=False, **kwargs):
+    batches = []
+    kwargs.setdefault("settle", 0)
+    watcher = FolderWatcher(directory, on_batch=lambda n, latency: batches.append((n, latency)), **kwargs)
+    watcher.run(skip_existing, once=True)
+    return batches
+
+
+def analyzed(directory):
+    # 结果文件中的 (来源文件, 正文)，按写入顺序；FileName 中第二篇起带有 #行号
+    with open(result_log_path(directory), "r", encoding="utf-8") as f:
+        return [(r["FileName"][0].split("#")[0], r["Document"][0]) for r in map(json.loads, f)]
+
+
+def test_appended_lines_only(tmp_path):
+    directory = str(tmp_path)
+    path = os.path.join(directory, "a.jsonl")
+    lines = read_health_corpus(5)
+    append_records(path, lines[:3])
+    assert run_once(directory)[0][0] == 3
+    assert run_once(directory) == []
+
+    append_records(path, lines[3:])
+    assert run_once(directory)[0][0] == 2
+    assert [doc for _, doc in analyzed(directory)] == lines
+    with open(watch_state_path(result_log_path(directory)), "r", encoding="utf-8") as f:
+        state = json.load(f)
+    assert state["files"]["a.jsonl"]["line"] == 5
+    assert state["files"]["a.jsonl"]["offset"] == os.path.getsize(path)
+
+
+def test_incomplete_last_line_waits(tmp_path):
+    directory = str(tmp_path)
+    path = os.path.join(directory, "a.jsonl")
+    lines = read_health_corpus(2)
+    append_records(path, lines[:1])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"content": lines[1]}, ensure_ascii=False)[:20])
+    # 刚写入、末行没有换行符：只读完整的行
+    assert run_once(directory, settle=60)[0][0] == 1
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"content": lines[1]}, ensure_ascii=False)[20:] + "\n")
+    assert run_once(directory, settle=60)[0][0] == 1
+    assert [doc for _, doc in analyzed(directory)] == lines
+
+
+def test_rewritten_file_is_reanalyzed(tmp_path):
+    directory = str(tmp_path)
+    path = os.path.join(directory, "a.jsonl")
+    lines = read_health_corpus(6)
+    append_records(path, lines[:2])
+    run_once(directory)
+    # 文件被整体改写（开头不同、长度更长）时从头重新分析
+    os.remove(path)
+    append_records(path, lines[2:6])
+    assert run_once(directory)[0][0] == 4
+    assert [doc for _, doc in analyzed(directory)] == lines
+
+
+def test_skip_existing_and_gzip(tmp_path):
+    directory = str(tmp_path)
+    lines = read_health_corpus(4)
+    append_records(os.path.join(directory, "old.jsonl"), lines[:2])
+    assert run_once(directory, skip_existing=True) == []
+
+    with gzip.open(os.path.join(directory, "new.jsonl.gz"), "wt", encoding="utf-8") as f:
+        for line in lines[2:]:
+            f.write(json.dumps({"content": line}, ensure_ascii=False) + "\n")
+    assert run_once(directory)[0][0] == 2
+    assert analyzed(directory) == [("new.jsonl.gz", line) for line in lines[2:]]
+
+
+def test_latency_counts_only_files_with_new_records(tmp_path):
+    directory = str(tmp_path)
+    lines = read_health_corpus(4)
+    append_records(os.path.join(directory, "old.jsonl"), lines[:2])
+    assert run_once(directory)[0][0] == 2
+
+    # 已分析且没有变化的旧文件不应把延迟拉长到它的到达时间
+    time.sleep(1.5)
+    append_records(os.path.join(directory, "new.jsonl"), lines[2:])
+    [(n, latency)] = run_once(directory)
+    assert n == 2
+    assert latency < 1.0
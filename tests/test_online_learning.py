@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+
+import nlp_core
+import online_learning
+from batch_engine import result_line
+
+TITLE = "高血压"
+DOCUMENT = "高血压患者要注意饮食，少吃盐，按时服药，定期监测血压。"
+
+
+@pytest.fixture
+def online(tmp_path, monkeypatch):
+    # 快照写到临时目录；每个测试从基础模型开始，相当于新启动的进程
+    model_dir = str(tmp_path / "online")
+    monkeypatch.setattr(nlp_core, "ONLINE_MODEL_DIR", model_dir)
+    monkeypatch.setattr(nlp_core, "USE_ONLINE_MODEL", True)
+    monkeypatch.setattr(nlp_core, "classifier", None)
+    monkeypatch.setattr(nlp_core, "resource_versions", {})
+    return model_dir
+
+
+def correct(log_path, label, d_mark="M", title=TITLE, document=DOCUMENT):
+    # 与 main.save_modify 相同的修正记录
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(result_line(d_mark, "a.txt", title, "", label, "无", "", document))
+
+
+def label_of(title=TITLE, document=DOCUMENT):
+    return nlp_core.analyze_content(title, document)["ClassLabel"]
+
+
+def restart(monkeypatch):
+    monkeypatch.setattr(nlp_core, "classifier", None)
+    monkeypatch.setattr(nlp_core, "resource_versions", {})
+
+
+def test_correction_changes_classification(online, tmp_path):
+    log_path = str(tmp_path / "result_log.jsonl")
+    base_version = nlp_core.model_version()
+    assert label_of() == "健康"
+
+    correct(log_path, "生活", d_mark="A")
+    correct(log_path, "不存在的类别")
+    correct(log_path, "生活")
+    learner = online_learning.CorrectionLearner()
+    # 只学习 D_Mark 为 M 且类标已知的记录
+    assert learner.update(log_path) == 1
+    assert label_of() == "生活"
+    clf = nlp_core.load_classifier()
+    assert isinstance(clf, online_learning.OnlineClassifier)
+    assert (clf.version, clf.samples) == (1, 1)
+    assert nlp_core.model_version() == base_version + "+online1"
+    assert os.path.exists(os.path.join(online, online_learning.snapshot_name(1)))
+
+    # 已读过的修正不再重复学习
+    assert learner.update(log_path) == 0
+    correct(log_path, "健康")
+    correct(log_path, "健康")
+    assert learner.update(log_path) == 2
+    assert nlp_core.load_classifier().version == 2
+    assert label_of() == "健康"
+
+
+def test_snapshot_loaded_after_restart(online, tmp_path, monkeypatch):
+    log_path = str(tmp_path / "result_log.jsonl")
+    correct(log_path, "教育")
+    online_learning.CorrectionLearner().update(log_path)
+    assert label_of() == "教育"
+
+    restart(monkeypatch)
+    assert label_of() == "教育"
+    assert nlp_core.model_version().endswith("+online1")
+    # 新进程从 current.json 中记录的位置继续读取修正
+    learner = online_learning.CorrectionLearner()
+    assert learner.update(log_path) == 0
+
+    # 基础模型换了以后，旧的增量快照不再使用
+    with open(os.path.join(online, online_learning.CURRENT_FILE), "r", encoding="utf-8") as f:
+        info = json.load(f)
+    online_learning.write_json_atomic(os.path.join(online, online_learning.CURRENT_FILE),
+                                      dict(info, base_version="other"))
+    restart(monkeypatch)
+    assert nlp_core.online_snapshot() is None
+    assert label_of() == "健康"
+
+
+def test_use_version_rolls_back(online, tmp_path):
+    log_path = str(tmp_path / "result_log.jsonl")
+    learner = online_learning.CorrectionLearner()
+    correct(log_path, "娱乐")
+    learner.update(log_path)
+    correct(log_path, "游戏")
+    correct(log_path, "游戏")
+    learner.update(log_path)
+    assert label_of() == "游戏"
+
+    clf = learner.use_version(1)
+    assert clf.version == 1
+    assert nlp_core.model_version().endswith("+online1")
+    assert label_of() == "娱乐"
+    assert nlp_core.online_snapshot()["version"] == 1
+
+    # 回滚后继续学习时使用新的版本号，不覆盖版本 2
+    correct(log_path, "娱乐")
+    learner.update(log_path)
+    assert nlp_core.load_classifier().version == 3
+    assert online_learning.list_snapshots() == [1, 2, 3]
@@ -0,0 +1,45 @@
+import pytest
+
+from batch_engine import result_line
+from result_binlog import BinaryResultLog, convert, iter_jsonl
+
+
+def sample_lines():
+    shared = "高血压患者应低盐饮食，定期监测血压。\n第二段：注意休息。"
+    return [
+        result_line("A", "a.jsonl", "高血压饮食", "高血压、饮食", "健康", "北京", "高血压患者应低盐饮食。", shared),
+        result_line("A", "a.jsonl#2", "同样的正文", "高血压", "健康", "", "摘要", shared, DuplicateOf="a.jsonl"),
+        result_line("M", "a.jsonl", "人工修正", "血压", "生活", "张三", "", shared),
+        result_line("A", "b.jsonl", "", "", "生活", "", "", ""),
+        result_line("A", "c.jsonl", "emoji 😀 \"引号\" \\ 反斜杠", "a\tb", "科技", "上海", "x\ny", "😀" * 1000),
+    ]
+
+
+def test_jsonl_rlog_round_trip(tmp_path):
+    src = tmp_path / "result_log.jsonl"
+    src.write_text("".join(sample_lines()), encoding="utf-8")
+    rlog = str(tmp_path / "result_log.rlog")
+    back = str(tmp_path / "back.jsonl")
+
+    assert convert(str(src), rlog) == 5
+    assert convert(rlog, back) == 5
+    assert list(iter_jsonl(back)) == list(iter_jsonl(str(src)))
+
+
+def test_rlog_stores_shared_documents_once(tmp_path):
+    src = tmp_path / "result_log.jsonl"
+    src.write_text("".join(sample_lines()), encoding="utf-8")
+    rlog = str(tmp_path / "result_log.rlog")
+    convert(str(src), rlog)
+    with BinaryResultLog(rlog) as log:
+        records = list(log.iter_records(documents=False))
+    assert [r["FileName"] for r in records] == ["a.jsonl", "a.jsonl#2", "a.jsonl", "b.jsonl", "c.jsonl"]
+    assert records[1]["DuplicateOf"] == "a.jsonl"
+    # 三条记录的原文相同，只以同一个 sha1 引用
+    assert len({r["Document"] for r in records[:3]}) == 1
+
+
+def test_convert_refuses_same_file(tmp_path):
+    path = str(tmp_path / "result_log.jsonl")
+    with pytest.raises(ValueError):
+        convert(path, path)
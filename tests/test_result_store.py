@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+
+from batch_engine import result_line
+from result_binlog import BinaryResultLog
+from result_store import ResultStore, SqliteResultStore, open_result_store
+
+
+def write_lines(path, lines):
+    if path.endswith(".rlog"):
+        with BinaryResultLog(path) as log:
+            for line in lines:
+                log.append(json.loads(line))
+    else:
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+
+def batch_lines(prefix, n, document):
+    return [result_line("A", f"{prefix}{i}.jsonl", f"题目{i}", "关键词", "健康", "", "摘要", document) for i in range(n)]
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".rlog"])
+def test_latest_after_truncate_and_longer_append(tmp_path, suffix):
+    # 续跑批量任务：日志截回检查点后追加更长的记录，总长度超过原来的索引位置
+    path = str(tmp_path / f"result_log{suffix}")
+    write_lines(path, batch_lines("a", 2, "短正文"))
+    checkpoint = os.path.getsize(path)
+    write_lines(path, batch_lines("b", 3, "中断前写出的正文"))
+
+    store = open_result_store(path)
+    assert store.latest("b2.jsonl", "A")["Document"] == ["中断前写出的正文"]
+
+    os.truncate(path, checkpoint)
+    write_lines(path, batch_lines("c", 3, "续跑后写出的更长的正文" * 20))
+    assert os.path.getsize(path) > checkpoint
+
+    assert store.latest("b2.jsonl", "A") is None
+    assert store.latest("c1.jsonl", "A")["Document"] == ["续跑后写出的更长的正文" * 20]
+    assert store.latest("a1.jsonl", "A")["Title"] == ["题目1"]
+    store.close()
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".rlog"])
+def test_latest_prefers_newest_record(tmp_path, suffix):
+    path = str(tmp_path / f"result_log{suffix}")
+    store = open_result_store(path)
+    store.append(result_line("A", "a.jsonl", "自动", "", "健康", "", "", "正文"))
+    store.append(result_line("M", "a.jsonl", "人工一", "", "生活", "", "", "正文"))
+    store.append(result_line("M", "a.jsonl", "人工二", "", "生活", "", "", "正文"))
+    assert store.latest("a.jsonl", "M")["Title"] == ["人工二"]
+    assert store.latest("a.jsonl", "A")["Title"] == ["自动"]
+    store.clear()
+    assert store.latest("a.jsonl", "M") is None
+    store.close()
+
+
+def test_sqlite_index_persists_and_survives_rewrite(tmp_path):
+    path = str(tmp_path / "result_log.jsonl")
+    write_lines(path, batch_lines("a", 3, "正文"))
+    store = open_result_store(path, use_sqlite=True)
+    assert isinstance(store, SqliteResultStore)
+    checkpoint = store.indexed_offset
+    store.append(result_line("M", "a1.jsonl", "人工修正", "", "生活", "", "", "正文"))
+    store.close()
+
+    # 已有持久化索引时自动沿用，只扫描新追加的行
+    write_lines(path, batch_lines("b", 2, "新正文"))
+    store = open_result_store(path)
+    assert isinstance(store, SqliteResultStore)
+    assert store.latest("a1.jsonl", "M")["Title"] == ["人工修正"]
+    assert store.latest("b1.jsonl", "A")["Document"] == ["新正文"]
+    store.close()
+
+    # 关闭期间日志被截断后追加得更长
+    os.truncate(path, checkpoint)
+    write_lines(path, batch_lines("c", 3, "续跑后的正文" * 30))
+    store = open_result_store(path)
+    assert store.latest("a1.jsonl", "M") is None
+    assert store.latest("b1.jsonl", "A") is None
+    assert store.latest("c2.jsonl", "A")["Document"] == ["续跑后的正文" * 30]
+    store.close()
+
+
+def test_small_logs_use_memory_index(tmp_path):
+    path = str(tmp_path / "result_log.jsonl")
+    write_lines(path, batch_lines("a", 2, "正文"))
+    store = open_result_store(path)
+    assert type(store) is ResultStore
+    store.close()
@@ -0,0 +1,49 @@
+import jieba
+import jieba.posseg as pseg
+
+import nlp_core
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "张三在北京大学发表演讲，李四来自上海交通大学。",
+    "COVID-19疫苗接种率达到95.5%，奥密克戎变异株BA.5传播更快",
+    "第一行\n\n第二行\t制表符\r\n结尾",
+    "iPhone 15 Pro Max 售价 9999 元 😀",
+    "的的的了了了",
+    "喔唷嗯哼",
+]
+
+
+def old_segment(text):
+    # 合并为一次切分之前的写法：jieba.lcut 与 pseg.cut 各切一遍
+    return jieba.lcut(text), [(p.word, p.flag) for p in pseg.cut(text)]
+
+
+def test_segment_matches_jieba(health_lines):
+    for text in health_lines + EDGE_CASES:
+        words, pairs = nlp_core.segment(text)
+        assert (words, pairs) == old_segment(text), text
+
+
+def test_segment_matches_jieba_on_long_text(health_lines):
+    text = "".join(health_lines)
+    assert nlp_core.segment(text) == old_segment(text)
+
+
+def test_private_pos_cut_is_available():
+    # segment() 依赖 jieba 0.42.1 的私有方法 POSTokenizer.__cut_detail；升级 jieba 后该方法消失时这里会失败，
+    # 需要重新核对 segment() 与 pseg.cut 的一致性后再更新 requirements.txt 中固定的版本
+    assert nlp_core._pos_cut_detail is not None, f"jieba {jieba.__version__} 中已没有 POSTokenizer.__cut_detail"
+
+
+def test_segment_falls_back_without_private_pos_cut(monkeypatch, health_lines):
+    monkeypatch.setattr(nlp_core, "_pos_cut_detail", None)
+    nlp_core._cut_unknown.cache_clear()
+    try:
+        for text in health_lines[:50] + EDGE_CASES:
+            words, pairs = nlp_core.segment(text)
+            assert words == jieba.lcut(text)
+            assert "".join(w for w, _ in pairs) == text
+    finally:
+        nlp_core._cut_unknown.cache_clear()
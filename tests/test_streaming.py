@@ -0,0 +1,60 @@
+import tracemalloc
+
+import pytest
+
+import nlp_core
+from conftest import read_health_corpus
+
+
+@pytest.fixture(scope="module")
+def long_document():
+    lines = read_health_corpus()
+    return "。".join(lines[i % len(lines)] for i in range(400)) + "。"
+
+
+def analyze_in_memory(monkeypatch, title, document):
+    monkeypatch.setattr(nlp_core, "ANALYSIS_MEMORY_BUDGET", len(document) * nlp_core.STREAM_BYTES_PER_CHAR * 2)
+    assert isinstance(nlp_core.analyzed_document(title, document, set()), nlp_core.AnalyzedDocument)
+    return nlp_core.analyze_content(title, document)
+
+
+def test_streaming_matches_in_memory(monkeypatch, long_document):
+    title = "高血压患者的饮食和运动"
+    expected = analyze_in_memory(monkeypatch, title, long_document)
+    monkeypatch.setattr(nlp_core, "ANALYSIS_MEMORY_BUDGET", 0)
+    assert nlp_core.stream_window_chars() == nlp_core.MIN_STREAM_WINDOW < len(long_document)
+    assert isinstance(nlp_core.analyzed_document(title, long_document, set()), nlp_core.StreamingDocument)
+    assert nlp_core.analyze_content(title, long_document) == expected
+
+
+@pytest.mark.parametrize("window", [64, 500, 3000])
+def test_small_windows_match_in_memory(long_document, window):
+    # 窗口在标点处切分，任意窗口大小的各项结果都与整篇分析相同
+    stopwords = nlp_core.load_stopwords()
+    title = "感冒了怎么办"
+    full = nlp_core.AnalyzedDocument(title, long_document, stopwords)
+    streamed = nlp_core.StreamingDocument(title, long_document, stopwords, window=window)
+    assert streamed.token_count == full.token_count
+    assert streamed.content_words == full.content_words
+    assert streamed.word_counts() == full.word_counts()
+    assert streamed.keywords() == full.keywords()
+    assert streamed.entities() == full.entities()
+    assert streamed.classifier_input() == full.classifier_input()
+    assert nlp_core.extract_fields(streamed, stopwords) == nlp_core.extract_fields(full, stopwords)
+
+
+def test_streaming_peak_memory_is_bounded(long_document):
+    stopwords = nlp_core.load_stopwords()
+    window = nlp_core.MIN_STREAM_WINDOW
+    nlp_core.StreamingDocument("", long_document, stopwords, window=window)
+
+    def peak(document):
+        tracemalloc.start()
+        try:
+            nlp_core.StreamingDocument("", document, stopwords, window=window)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # 流式分析只保留一个窗口的分词结果，正文变长四倍，峰值内存增长不到一倍（整篇分析约为四倍）
+    assert peak(long_document * 4) < peak(long_document) * 2
@@ -1,13 +1,21 @@
 import os
+import sys
+import json
 import random
+import sqlite3
+import hashlib
+import argparse
+import multiprocessing
 import jieba
 import joblib
+import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 import warnings
+from nlp_core import file_digest
 
 warnings.filterwarnings('ignore')
 
@@ -17,12 +25,23 @@ TARGET_5CATS = ["教育", "健康", "生活", "娱乐", "游戏"]
 DATASET_ROOT = "THUCNews"
 HEALTH_CORPUS_PATH = "health_corpus.txt"
 MODEL_SAVE_PATH = "model/text_classifier_5cat.pkl"
+COMPACT_SAVE_DIR = "model/compact"
 
 # 增加样本量，提高模型泛化能力
 SAMPLE_PER_CAT = 600
 MAX_TFIDF_FEATURES = 4000
+LOGREG_C = 1.0
+# 样本选取的随机种子：同一种子每次选出相同的样本，分词缓存可以命中，不同参数的训练结果也可直接比较
+SAMPLE_SEED = 42
 STOPWORDS_PATH = "stopwords.txt"
 
+# 分词结果缓存：调整特征数、C 等参数重新训练时无需再次分词；只在训练时使用，放在 model/ 之外以免被打包
+TOKEN_CACHE_PATH = "cache/token_cache.sqlite"
+MIN_CONTENT_CHARS = 80
+MIN_VALID_WORDS = 15
+# 每个类别每轮并行分词的文件数 = 进程数 * TOKENIZE_WINDOW
+TOKENIZE_WINDOW = 64
+
 CATEGORY_MAPPING = {
     "教育": "教育",
     "游戏": "游戏",
@@ -47,91 +66,168 @@ def load_stopwords():
     return []
 
 
-def load_health_corpus():
+def tokenize_text(text, stopwords):
+    words = jieba.lcut(text)
+    return " ".join(w for w in words if w not in stopwords and len(w) > 1 and w.strip())
+
+
+worker_stopwords = None
+
+
+def init_tokenizer_worker():
+    global worker_stopwords
+    jieba.setLogLevel(jieba.logging.WARNING)
+    jieba.initialize()
+    worker_stopwords = set(load_stopwords())
+
+
+def tokenize_line(line):
+    return tokenize_text(line, worker_stopwords)
+
+
+def tokenize_file(file_path):
+    # 返回 None 表示读取失败；正文过短的文件返回空串，不再分词
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+    except Exception:
+        return None
+    if len(content) < MIN_CONTENT_CHARS:  # 增加最小长度要求
+        return ""
+    return tokenize_text(content, worker_stopwords)
+
+
+class TokenCache:
+    # 以文件路径（及其 mtime/大小）或语料行的哈希为键保存分词结果；停用词或 jieba 版本变化时整体失效
+
+    def __init__(self, path=TOKEN_CACHE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, signature TEXT, text TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        version = hashlib.sha1(("\n".join(sorted(load_stopwords())) + jieba.__version__).encode("utf-8")).hexdigest()
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if not row or row[0] != version:
+            self.conn.execute("DELETE FROM tokens")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+            self.conn.commit()
+
+    def get_many(self, keys_signatures):
+        found = {}
+        for key, signature in keys_signatures:
+            row = self.conn.execute("SELECT signature, text FROM tokens WHERE key = ?", (key,)).fetchone()
+            if row and row[0] == signature:
+                found[key] = row[1]
+        return found
+
+    def put_many(self, items):
+        self.conn.executemany("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)", items)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def file_signature(file_path):
+    st = os.stat(file_path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def line_key(line):
+    return "health:" + hashlib.sha1(line.encode("utf-8")).hexdigest()
+
+
+def load_health_corpus(pool, cache, sample_per_cat=SAMPLE_PER_CAT, seed=SAMPLE_SEED):
     if not os.path.exists(HEALTH_CORPUS_PATH):
         raise FileNotFoundError(f"健康类语料文件 {HEALTH_CORPUS_PATH} 不存在")
 
-    health_texts = []
     with open(HEALTH_CORPUS_PATH, "r", encoding="utf-8") as f:
         lines = [line.strip() for line in f if line.strip()]
 
-    if len(lines) < SAMPLE_PER_CAT:
-        print(f"健康类语料不足{SAMPLE_PER_CAT}条，使用全部{len(lines)}条")
+    if len(lines) < sample_per_cat:
+        print(f"健康类语料不足{sample_per_cat}条，使用全部{len(lines)}条")
         selected_lines = lines
     else:
-        selected_lines = random.sample(lines, SAMPLE_PER_CAT)
+        selected_lines = random.Random(f"{seed}:健康").sample(lines, sample_per_cat)
+
+    keys = [line_key(line) for line in selected_lines]
+    cached = cache.get_many((key, "") for key in keys)
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    tokenized = pool.map(tokenize_line, [selected_lines[i] for i in missing], chunksize=64)
+    cache.put_many((keys[i], "", text) for i, text in zip(missing, tokenized))
+    cached.update((keys[i], text) for i, text in zip(missing, tokenized))
 
-    stopwords = load_stopwords()
+    return [cached[key] for key in keys if cached[key]]
 
-    for line in selected_lines:
-        words = jieba.lcut(line)
-        valid_words = [w for w in words if w not in stopwords and len(w) > 1 and w.strip()]
-        if valid_words:
-            health_texts.append(" ".join(valid_words))
 
-    return health_texts
+def tokenize_files(pool, cache, file_paths):
+    keyed = [(path, file_signature(path)) for path in file_paths]
+    cached = cache.get_many(keyed)
+    missing = [(path, sig) for path, sig in keyed if path not in cached]
+    if missing:
+        tokenized = pool.map(tokenize_file, [path for path, _ in missing], chunksize=8)
+        cache.put_many((path, sig, text) for (path, sig), text in zip(missing, tokenized) if text is not None)
+        cached.update((path, text) for (path, _), text in zip(missing, tokenized))
+    return [cached[path] for path in file_paths]
 
 
-def load_train_data():
+def load_train_data(sample_per_cat=SAMPLE_PER_CAT, workers=None, seed=SAMPLE_SEED):
     texts = []
     labels = []
-    stopwords = load_stopwords()
     cat_count = {cat: 0 for cat in TARGET_5CATS}
+    workers = workers or os.cpu_count() or 1
+    window = workers * TOKENIZE_WINDOW
+    cache = TokenCache()
+
+    with multiprocessing.Pool(workers, initializer=init_tokenizer_worker) as pool:
+        # 加载健康类语料
+        health_samples = load_health_corpus(pool, cache, sample_per_cat, seed)
+        texts.extend(health_samples)
+        labels.extend(["健康"] * len(health_samples))
+        cat_count["健康"] = len(health_samples)
+
+        # 加载THUCNews数据
+        for original_cat in sorted(os.listdir(DATASET_ROOT)):
+            cat_path = os.path.join(DATASET_ROOT, original_cat)
+            if not os.path.isdir(cat_path):
+                continue
+            if original_cat not in CATEGORY_MAPPING:
+                continue
 
-    # 加载健康类语料
-    health_samples = load_health_corpus()
-    texts.extend(health_samples)
-    labels.extend(["健康"] * len(health_samples))
-    cat_count["健康"] = len(health_samples)
-
-    # 加载THUCNews数据
-    for original_cat in os.listdir(DATASET_ROOT):
-        cat_path = os.path.join(DATASET_ROOT, original_cat)
-        if not os.path.isdir(cat_path):
-            continue
-        if original_cat not in CATEGORY_MAPPING:
-            continue
-
-        target_cat = CATEGORY_MAPPING[original_cat]
-        if target_cat == "健康":  # 健康类已单独处理
-            continue
-
-        if cat_count[target_cat] >= SAMPLE_PER_CAT:
-            continue
-
-        txt_files = [f for f in os.listdir(cat_path) if f.endswith(".txt")]
-        random.shuffle(txt_files)
-
-        for filename in txt_files:
-            if cat_count[target_cat] >= SAMPLE_PER_CAT:
-                break
-
-            file_path = os.path.join(cat_path, filename)
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read().strip()
-                    if len(content) < 80:  # 增加最小长度要求
-                        continue
+            target_cat = CATEGORY_MAPPING[original_cat]
+            if target_cat == "健康":  # 健康类已单独处理
+                continue
 
-                    words = jieba.lcut(content)
-                    valid_words = [w for w in words if w not in stopwords and len(w) > 1 and w.strip()]
-                    if len(valid_words) < 15:  # 增加最小词汇量要求
-                        continue
+            if cat_count[target_cat] >= sample_per_cat:
+                continue
 
-                    texts.append(" ".join(valid_words))
+            # 每个类别使用独立的随机序列，与目录的遍历顺序无关
+            txt_files = sorted(f for f in os.listdir(cat_path) if f.endswith(".txt"))
+            random.Random(f"{seed}:{original_cat}").shuffle(txt_files)
+
+            # 按打乱后的顺序逐窗口并行分词，凑够样本数即停止，选取结果与逐个处理一致
+            for start in range(0, len(txt_files), window):
+                if cat_count[target_cat] >= sample_per_cat:
+                    break
+                paths = [os.path.join(cat_path, f) for f in txt_files[start:start + window]]
+                for text in tokenize_files(pool, cache, paths):
+                    if cat_count[target_cat] >= sample_per_cat:
+                        break
+                    if not text or len(text.split(" ")) < MIN_VALID_WORDS:  # 增加最小词汇量要求
+                        continue
+                    texts.append(text)
                     labels.append(target_cat)
                     cat_count[target_cat] += 1
 
-            except Exception as e:
-                continue
-
+    cache.close()
     print(f"训练数据分布: {cat_count}")
     return texts, labels
 
 
-def train_model():
+def train_model(sample_per_cat=SAMPLE_PER_CAT, max_features=MAX_TFIDF_FEATURES, c=LOGREG_C, workers=None,
+                seed=SAMPLE_SEED):
     os.makedirs(os.path.dirname(MODEL_SAVE_PATH), exist_ok=True)
-    texts, labels = load_train_data()
+    texts, labels = load_train_data(sample_per_cat, workers, seed)
 
     x_train, x_test, y_train, y_test = train_test_split(
         texts, labels, test_size=0.2, random_state=42, stratify=labels
@@ -140,14 +236,14 @@ def train_model():
     # 使用逻辑回归
     model = Pipeline([
         ("tfidf", TfidfVectorizer(
-            max_features=MAX_TFIDF_FEATURES,
+            max_features=max_features,
             ngram_range=(1, 2),
             stop_words=load_stopwords(),
             min_df=2,
             max_df=0.8
         )),
         ("clf", LogisticRegression(
-            C=1.0,
+            C=c,
             max_iter=1000,
             random_state=42,
             class_weight='balanced'  # 处理类别不平衡
@@ -165,9 +261,59 @@ def train_model():
     print(f"模型保存路径：{MODEL_SAVE_PATH}")
     print(f"模型体积：{model_size:.2f} MB")
 
+    export_compact_model(model)
+
+
+def export_compact_model(model, out_dir=COMPACT_SAVE_DIR, source_path=MODEL_SAVE_PATH):
+    # 导出只依赖 numpy 的推理文件：排序后的词表与按同一顺序排列的 IDF、系数矩阵，均可内存映射
+    tfidf = model.named_steps["tfidf"]
+    clf = model.named_steps["clf"]
+    if tfidf.analyzer != "word" or tfidf.tokenizer is not None or tfidf.preprocessor is not None:
+        raise ValueError("仅支持默认分词方式的 TfidfVectorizer")
+    # 精简推理只实现了词频 × IDF 再归一化，其余会改变特征值的选项无法复现
+    if tfidf.sublinear_tf or tfidf.binary or not tfidf.use_idf or tfidf.strip_accents:
+        raise ValueError("精简推理模型不支持 sublinear_tf、binary、use_idf=False 与 strip_accents")
+
+    terms = np.array(sorted(tfidf.vocabulary_), dtype=str)
+    columns = np.array([tfidf.vocabulary_[t] for t in terms])
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "vocab.npy"), terms)
+    np.save(os.path.join(out_dir, "idf.npy"), tfidf.idf_[columns])
+    np.save(os.path.join(out_dir, "coef.npy"), np.ascontiguousarray(clf.coef_[:, columns]))
+    np.save(os.path.join(out_dir, "intercept.npy"), clf.intercept_)
+
+    meta = {
+        "classes": [str(c) for c in clf.classes_],
+        "token_pattern": tfidf.token_pattern,
+        "lowercase": tfidf.lowercase,
+        "ngram_range": list(tfidf.ngram_range),
+        "stop_words": sorted(tfidf.get_stop_words() or []),
+        "norm": tfidf.norm,
+        "source_digest": file_digest(source_path),
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+
+    size = sum(os.path.getsize(os.path.join(out_dir, n)) for n in os.listdir(out_dir)) / 1024 / 1024
+    print(f"精简推理模型保存路径：{out_dir}")
+    print(f"精简推理模型体积：{size:.2f} MB")
+
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="训练五分类文本分类器")
+    parser.add_argument("--export-only", action="store_true", help="不重新训练，只从已保存的模型导出精简推理文件")
+    parser.add_argument("--samples-per-cat", type=int, default=SAMPLE_PER_CAT, help="每个类别的样本数")
+    parser.add_argument("--max-features", type=int, default=MAX_TFIDF_FEATURES, help="TF-IDF 最大特征数")
+    parser.add_argument("-C", type=float, default=LOGREG_C, help="逻辑回归正则化参数 C")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="分词进程数，默认为 CPU 核数")
+    parser.add_argument("--seed", type=int, default=SAMPLE_SEED, help="样本选取的随机种子")
+    args = parser.parse_args()
     try:
-        train_model()
+        if args.export_only:
+            export_compact_model(joblib.load(MODEL_SAVE_PATH))
+        else:
+            train_model(args.samples_per_cat, args.max_features, args.C, args.workers, args.seed)
     except Exception as e:
         print(f"训练异常：{str(e)}")
\ No newline at end of file